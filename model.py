@@ -67,11 +67,17 @@ def main ():
 			else:
 				stdout.write (message_function ())
 
-	def shuffle (l):
-		r = Random ()
-		new_list = [[r.randint (0, len (l)), x] for x in l]
-		new_list.sort ()
-		return [y[1] for y in new_list]
+	shuffle_generator = Random ()
+
+	def shuffle (l, r = shuffle_generator):
+		#
+		# A uniformly random permutation of l (Random.shuffle is a Fisher-Yates
+		# shuffle), drawn from one generator rather than a new one for each call.
+		#
+
+		new_list = list (l)
+		r.shuffle (new_list)
+		return new_list
 
 	class node:
 		#
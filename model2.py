@@ -5,1075 +5,4560 @@
 # Licensed under the LGPL, latest version.
 #
 
+from argparse import ArgumentParser
+from bisect import bisect_left
+from bisect import bisect_right
+from collections import deque
+from hashlib import md5
+from heapq import heappop
+from heapq import heappush
+from itertools import count
+from itertools import imap
+from cPickle import dumps as pickle
+from cPickle import loads as unpickle
+from json import dump as write_json
+from json import dumps as json_text
+from json import load as read_json
+from math import ceil
+from multiprocessing import cpu_count
+from multiprocessing import Pool
+from os import getpid
+from os import rename
+from os.path import exists
+from os.path import getsize
+from os.path import join
 from random import Random
+from random import SystemRandom
+from struct import calcsize
+from struct import pack
+from struct import unpack_from
+from sys import argv
 from sys import stderr
 from sys import stdout
+from sys import version
+from time import time as wall_clock
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+try:
+	from resource import getrusage
+	from resource import RUSAGE_SELF
+except ImportError:
+	getrusage = None
 
 #
 # Generic simulation code
 #
 
-def main ():
+#
+# These are keys used to index connections between nodes.
+#
+
+class directions:
+	north = "n"
+	south = "s"
+	east = "e"
+	west = "w"
+
+def opposite (s):
+	if s == directions.north: return directions.south
+	if s == directions.south: return directions.north
+	if s == directions.east:  return directions.west
+	if s == directions.west:  return directions.east
+	return None
+
+def ordinal (s):
+	#
+	# Right and down are positive; other directions
+	# are negative.
+	#
+
+	if s == directions.north or s == directions.west: return -1
+	if s == directions.east or s == directions.south: return 1
+	return None
+
+class debugging:
+	very_verbose = 5
+	quite_verbose = 4
+	moderately_verbose = 3
+	not_looped = 2
+	status = 1
+	output = 0
+	error = -1
+	
+	tracing = True
+	current_debug = very_verbose
+
+	#
+	# A trace_buffer or trajectory_recorder to record what passengers do, or None.
+	# The engines look at this once per run, so leaving it off costs next to nothing.
+	#
+
+	trace = None
+
+def debug (level, message_function):
+	#
+	# I'm using a message function for optimization purposes. If we don't end up
+	# using this level of debugging, then there's no reason to compute the string
+	# required.
+	#
+
+	if level <= debugging.current_debug:
+		if level >= debugging.error:
+			stdout.write (message_function () + "\n")
+		else:
+			stderr.write (message_function () + "\n")
+
+class trace_buffer:
+	#
+	# Keeps the last capacity events of a traced run as (time, event, passenger,
+	# row, file) tuples, where the event is one of board, move, stow, cross and
+	# wait and the row and file are of where the passenger ended up. Nothing is
+	# formatted until the buffer is written out.
+	#
+	# The engines call begin and end around a run, record for boarding and waking up,
+	# and before and observe around each passenger's step.
+	#
+
+	def __init__ (self, capacity = 10000):
+		self.events = deque (maxlen = capacity)
+
+	def begin (self, plane, time_step):
+		pass
+
+	def end (self, time):
+		pass
+
+	def record (self, time, event, passenger, cell):
+		self.events.append ((time, event, passenger.sequence_identifier, cell.row, cell.file))
+
+	def before (self, passenger):
+		return (passenger.location, passenger.number_of_bags, passenger.needed_to_wait)
+
+	def observe (self, time, passenger, before):
+		#
+		# Works out what a passenger's step did, given what they looked like before it.
+		# A move of more than one cell is a crossing.
+		#
+
+		location, number_of_bags, needed_to_wait = before
+
+		if passenger.number_of_bags < number_of_bags:
+			self.record (time, "stow", passenger, passenger.location)
+
+		if passenger.location != location:
+			if abs (passenger.location.row - location.row) + abs (passenger.location.file - location.file) > 1:
+				self.record (time, "cross", passenger, passenger.location)
+			else:
+				self.record (time, "move", passenger, passenger.location)
+		elif passenger.needed_to_wait > needed_to_wait:
+			self.record (time, "wait", passenger, passenger.location)
+
+	def write (self, stream):
+		for event in self.events:
+			stream.write ("%8.1f %-5s #%4d (%3d, %3d)\n" % event)
+
+class trajectory_recorder:
+	#
+	# Writes every passenger's trajectory to a binary file, a run at a time, so that
+	# any frame of any run can be drawn again afterwards (see replay_trajectories).
+	# It is used in place of a trace_buffer.
+	#
+	# The file starts with a text header padded to header_size bytes, as result
+	# files do. Each run is a run_format record (the plane's name, the time step and
+	# the numbers of passengers and cells) followed by an event_format record for
+	# each time a passenger boards, moves, stows a bag, takes on delay or hands back
+	# the cells it borrowed: the ticks since the last event, the passenger's index in
+	# plane.passengers, the index of its cell in plane.cells, its delay, bags and
+	# waits afterwards, and how many cells it is borrowing, whose indices follow as
+	# unsigned shorts. An event for passenger end_of_run closes the run; its delay is
+	# the boarding time. Waiting in the aisle isn't an event, since pictures of the
+	# aisle don't show it.
+	#
+
+	run_format = "<24sdII"
+	event_format = "<HHHfBHB"
+	end_of_run = 0xFFFF
+	header_size = 256
+	header = ("mcm2007 trajectories\n" + run_format + "\n" + event_format + "\n").ljust (header_size - 1) + "\n"
+
+	def __init__ (self, path):
+		self.file = file (path, 'wb')
+		self.file.write (trajectory_recorder.header)
+
+	def begin (self, plane, time_step):
+		self.time_step = time_step
+		self.tick = 0
+		self.passenger_indices = dict ([(id (p), i) for i, p in enumerate (plane.passengers)])
+		self.cell_indices = dict ([(id (c), i) for i, c in enumerate (plane.cells)])
+		self.file.write (pack (trajectory_recorder.run_format, plane.name, time_step, len (plane.passengers), len (plane.cells)))
+
+	def end (self, time):
+		self.write_event (time, trajectory_recorder.end_of_run, 0, time, 0, 0, [])
+		self.file.flush ()
+
+	def record (self, time, event, passenger, cell):
+		if event == "board":
+			self.write_passenger (time, passenger)
+
+	def before (self, passenger):
+		return (passenger.location, passenger.number_of_bags, passenger.personal_delay_counter, \
+				passenger.needed_to_wait, tuple (imap (id, passenger.borrowed_cells)))
+
+	def observe (self, time, passenger, before):
+		location, number_of_bags, delay, needed_to_wait, borrowed = before
+
+		if passenger.location != location or passenger.number_of_bags != number_of_bags or \
+				passenger.personal_delay_counter > delay or tuple (imap (id, passenger.borrowed_cells)) != borrowed or \
+				(passenger.needed_to_wait != needed_to_wait and not passenger.location.is_aisle ()):
+			self.write_passenger (time, passenger)
+
+	def write_passenger (self, time, passenger):
+		self.write_event (time, self.passenger_indices [id (passenger)], self.cell_indices [id (passenger.location)], \
+				passenger.personal_delay_counter, passenger.number_of_bags, passenger.needed_to_wait, \
+				[self.cell_indices [id (cell)] for cell in passenger.borrowed_cells])
+
+	def write_event (self, time, passenger_index, cell_index, delay, number_of_bags, needed_to_wait, borrowed):
+		tick = int (round (time / self.time_step))
+
+		if tick - self.tick > 0xFFFF:
+			raise ValueError ("more than 65535 ticks without a passenger doing anything")
+
+		self.file.write (pack (trajectory_recorder.event_format, tick - self.tick, passenger_index, cell_index, delay, \
+				number_of_bags, min (needed_to_wait, 0xFFFF), len (borrowed)) + pack ("<%dH" % len (borrowed), *borrowed))
+		self.tick = tick
+
+	def close (self):
+		self.file.close ()
+
+class randomness:
+	#
+	# shuffle () draws from this generator; every run reseeds it so that the
+	# boarding order of a run is reproducible from its seed.
+	#
+	# Seeds go one way: a batch has a root seed, each of its trials a seed derived
+	# from that and the trial's place in the batch, and each trial draws its
+	# passengers and delays from Random (seed) and everything else (the shuffle,
+	# the jet bridges, common random numbers) from streams seeded with
+	# derive_seed (seed, purpose). A single run is a trial whose seed is given, or
+	# drawn by fresh_seed and reported.
+	#
+
+	shuffle_generator = Random ()
+
+def derive_seed (*parts):
+	#
+	# Deterministic across processes and runs, unlike hash ().
+	#
+
+	return int (md5 (repr (parts)).hexdigest () [:15], 16)
+
+def fresh_seed ():
+	#
+	# A seed for a run that wasn't given one, the same size as derive_seed's. It has
+	# to be an int, not a long, since derive_seed would see the L in its repr.
+	#
+
+	return int (SystemRandom ().getrandbits (60))
+
+def shuffle (l, r = None):
+	#
+	# Returns a uniformly random permutation of l, drawn from r (or from
+	# randomness.shuffle_generator). This used to sort l by a random key from
+	# randint (0, len (l)), which tied often enough to bias the order towards the
+	# original one; Random.shuffle is a Fisher-Yates shuffle, which doesn't sort
+	# at all.
+	#
+
+	new_list = list (l)
+	(r or randomness.shuffle_generator).shuffle (new_list)
+	return new_list
+
+class node:
+	#
+	# Note that these row and file are mainly for reference
+	# purposes so that we can have each node print out its
+	# contents in a meaningful way.
+	#
+
+	#
+	# Arranged like this:
+	#
+	# SSSS A SSS A SSSS
+	#      A     A
+	# SSSS A SSS A SSSS
+	#      ...
+	# where vertical is row and horizontal is file.
+	#
+
+	def __init__ (self, row, file, nearest_luggage_bin):
+		self.current_occupant = None
+		self.row = row
+		self.file = file
+		self.nearest_luggage_bin = nearest_luggage_bin
+		self.connectors = {directions.north: None, directions.south: None, directions.east: None, directions.west: None}
+
+	def __str__ (self):
+		if self.nearest_luggage_bin:
+			return " B(%3d, %3d)B " % (self.row, self.file)
+		else:
+			return "  (%3d, %3d)  " % (self.row, self.file)
+
+	def available (self):
+		return self.current_occupant == None
+
+	def enter (self, someone):
+		self.current_occupant = someone
+		someone.location = self
+		return self
+
+	def leave (self, someone):
+		self.current_occupant = None
+		return self
+
+	def connect (self, direction, destination):
+		#
+		# Connects this to another node (and vice versa) and returns the destination.
+		#
+
+		self.connectors [direction] = destination
+		destination.connectors [opposite(direction)] = self
+		return destination
+
+	def is_seat (self):
+		return not (self.connectors [directions.north] or self.connectors [directions.south])
+
+	def is_aisle (self):
+		return self.connectors [directions.north] or self.connectors [directions.south]
+
+	def shoot_off (self, direction):
+		n = self
+
+		while n.connectors [direction]:
+			n = n.connectors [direction]
+
+		return n
+
+	def travel (self, direction, distance):
+		n = self
+
+		for i in range (distance):
+			n = n.connectors [direction]
+
+		return n
+
+	def travel_until_empty (self, direction):
+		n = self
+		count = 0
+
+		#
+		# This function stops on borrowed nodes.
+		#
+
+		while n.connectors [direction] and n.connectors [direction].current_occupant and \
+				n.connectors [direction].current_occupant.location == n.connectors [direction]:
+			n = n.connectors [direction]
+			count += 1
+
+		return (count, n)
+
+	def nearest_aisle (self):
+		#
+		# Returns a 2-tuple with (distance, aisle_cell).
+		#
+
+		if self.is_aisle ():
+			return (0, self)
+		else:
+			west_offshoot = self
+			west_counter = 0
+			east_offshoot = self
+			east_counter = 0
+
+			while west_offshoot.connectors [directions.west] and not west_offshoot.connectors [directions.west].is_aisle ():
+				west_offshoot = west_offshoot.connectors [directions.west]
+				west_counter += 1
+
+			while east_offshoot.connectors [directions.east] and not east_offshoot.connectors [directions.east].is_aisle ():
+				east_offshoot = east_offshoot.connectors [directions.east]
+				east_counter += 1
+
+			if not west_offshoot.connectors [directions.west]:
+				return (east_counter, east_offshoot)
+
+			if not east_offshoot.connectors [directions.east]:
+				return (west_counter, west_offshoot)
+
+			if east_counter < west_counter:
+				return (east_counter, east_offshoot)
+			else:
+				return (west_counter, west_offshoot)
+
+	def trail (self, direction):
+		n = self
+		t = [n]
+
+		while n.connectors [direction]:
+			n = n.connectors [direction]
+			t += [n]
+
+		return t
+
+	def compact_representation (self):
+		if self.current_occupant:
+			if self.current_occupant.location != self:
+				#
+				# The occupant is borrowing a cell.
+				#
+
+				return " -%03d-%01d- " % (self.current_occupant.delay_remaining (), self.current_occupant.number_of_bags)
+			else:
+				if self.is_aisle ():
+					return " #%03d-%01d# " % (self.current_occupant.delay_remaining (), self.current_occupant.number_of_bags)
+				else:
+					return " ++%03d++ " % (self.current_occupant.needed_to_wait)
+		else:
+			if self.is_aisle ():
+				return "    |    "
+			else:
+				return "    -    "
+
+class step_counters:
+	#
+	# What passengers spend their time on, counted by boarder.step as it goes: the
+	# delay taken in each seek phase and in stowing bags, the ticks spent waiting for
+	# each reason (a full aisle cell, a borrowed cell, or a crossing that can't be
+	# made yet), and the seat crossings by how many people were crossed. A plane
+	# boarded through jet bridges (see jet_bridge) also counts the time its gate
+	# agents spent scanning and blocked by a full bridge, and the time passengers
+	# spent walking the bridges and held at the far end for the cabin door. The
+	# counts are a plain list indexed by the constants below, so counting costs an
+	# indexed add; each engine run starts current afresh and keeps it as its
+	# counters.
+	#
+
+	aisle_delay = 0
+	row_delay = 1
+	seat_delay = 2
+	stow_delay = 3
+	bags_stowed = 4
+	aisle_waits = 5
+	borrowed_cell_waits = 6
+	crossing_waits = 7
+	one_person_crossings = 8
+	two_person_crossings = 9
+	mid_seat_crossings = 10
+	gate_busy = 11
+	gate_blocked = 12
+	bridge_walk = 13
+	bridge_held = 14
+
+	names = ("aisle_delay", "row_delay", "seat_delay", "stow_delay", "bags_stowed", "aisle_waits", \
+			"borrowed_cell_waits", "crossing_waits", "one_person_crossings", "two_person_crossings", "mid_seat_crossings", \
+			"gate_busy", "gate_blocked", "bridge_walk", "bridge_held")
+
+	current = [0] * len (names)
+
+class boarder:
+	pre_boarding = None
+
+	find_aisle = 0
+	find_row = 1
+	find_seat = 2
+
+	#
+	# I'm using self.location to determine whether or not the boarder is on the plane.
+	# If they are not, then the location is None, whereas if they are, it will be set
+	# to someplace where they can find their way to their seats.
+	#
+	
+	def __init__ (self, location, target, number_of_bags, aisles_on_plane, SS, AS, SA, AA):
+		self.target = target
+		self.aisles_on_plane = aisles_on_plane
+		self.sequence_identifier = 0
+		self.reset (number_of_bags, SS, AS, SA, AA)
+
+		#
+		# Create a back-reference to the passenger.
+		#
+
+		target.passenger = self
+
+	def reset (self, number_of_bags, SS, AS, SA, AA):
+		#
+		# Everything about a boarder that changes during a simulation, so that a
+		# plane can be reused for another trial.
+		#
+
+		self.number_of_bags = number_of_bags
+		self.personal_delay_counter = 0
+		self.location = boarder.pre_boarding
+		self.seek_phase = boarder.find_aisle
+		self.SS = SS
+		self.SA = SA
+		self.AS = AS
+		self.AA = AA
+		self.needed_to_wait = 0
+		self.borrowed_cells = []
+
+		#
+		# The scheduler is set by event_driven_simulation while this boarder is on the
+		# plane; waiting_for is the cell that the last step was blocked on, if any.
+		#
+
+		self.scheduler = None
+		self.waiting_for = None
+	
+	def __str__ (self):
+		return "#%4d: %s --> %s; delay %4d; carrying %2d bags" % \
+			(self.sequence_identifier, str (self.location), str (self.target), self.personal_delay_counter, self.number_of_bags)
+
+	def number_of_bags_factor (self):
+		return self.number_of_bags_factor_function (self.number_of_bags)
+
+	def finished (self):
+		return self.location == self.target and self.personal_delay_counter == 0
+
+	def delay_remaining (self):
+		#
+		# Other boarders go through this (and add_delay) rather than touching the
+		# counter directly, since an event-driven scheduler only brings counters
+		# up to date when somebody looks at them.
+		#
+
+		if self.scheduler:
+			self.scheduler.synchronize (self)
+
+		return self.personal_delay_counter
+
+	def add_delay (self, amount):
+		if self.scheduler:
+			self.scheduler.synchronize (self)
+
+		self.personal_delay_counter += amount
+
+		if self.scheduler:
+			self.scheduler.delay_changed (self)
+
+	def step (self):
+		if self.personal_delay_counter == 0:
+			for cell in self.borrowed_cells:
+				if cell.current_occupant == self:
+					cell.current_occupant = None
+				else:
+					debug (debugging.error, lambda: "%s: Inconsistency in cell ownership of %s" % (str (self.location), str (cell)))
+
+			self.borrowed_cells = []
+			self.waiting_for = None
+
+			if self.location != self.target and self.location:
+				if self.seek_phase == boarder.find_aisle:
+					#
+					# Navigate towards the aisle closest to our seat (see seat_route).
+					#
+
+					if self.location.file < self.closest_aisle:
+						self.next_direction = directions.east
+					elif self.location.file > self.closest_aisle:
+						self.next_direction = directions.west
+					else:
+						self.seek_phase = boarder.find_row
+						self.next_direction = None
+
+					if self.next_direction:
+						if self.location.connectors [self.next_direction].available ():
+							delay = self.AA ()
+							self.personal_delay_counter += delay
+							step_counters.current [step_counters.aisle_delay] += delay
+							self.location.leave (self).connectors [self.next_direction].enter (self)
+						else:
+							self.needed_to_wait += 1
+							self.waiting_for = self.location.connectors [self.next_direction]
+							step_counters.current [step_counters.aisle_waits] += 1
+
+					#
+					# We're going to go ahead and fall through to the next if statement.
+					#
+
+				if self.seek_phase == boarder.find_row:
+					#
+					# Now, we embark upon the simple task of locating our row.
+					#
+
+					if self.location.row < self.target.row:
+						self.next_direction = directions.south
+					elif self.location.row > self.target.row:
+						self.next_direction = directions.north
+					else:
+						self.seek_phase = boarder.find_seat
+						self.next_direction = None
+					
+					if self.next_direction:
+						if self.location.connectors [self.next_direction]:
+							if self.location.connectors [self.next_direction].available ():
+								self.location.leave (self).connectors [self.next_direction].enter (self)
+								delay = self.AA ()
+								self.personal_delay_counter += delay
+								step_counters.current [step_counters.row_delay] += delay
+							else:
+								self.needed_to_wait += 1
+								self.waiting_for = self.location.connectors [self.next_direction]
+								step_counters.current [step_counters.aisle_waits] += 1
+								#debug (debugging.very_verbose, lambda: " > Waiting")
+						else:
+							debug (debugging.error, lambda: " > %s is trying to go along nonexistent path %s" % (str (self), self.next_direction))
+
+				if self.seek_phase == boarder.find_seat:
+					#
+					# Finally, we find the seat in question.
+					# First, we make sure that we don't have any bags.
+					#
+
+					if self.number_of_bags > 0 and self.target.route.luggage_bin:
+						delay = self.target.route.luggage_bin.load_delay (self.number_of_bags)
+						self.personal_delay_counter += delay
+						step_counters.current [step_counters.stow_delay] += delay
+						step_counters.current [step_counters.bags_stowed] += self.number_of_bags
+						self.number_of_bags = 0
+
+					if self.location.file > self.target.file:
+						self.next_direction = directions.west
+					elif self.location.file < self.target.file:
+						self.next_direction = directions.east
+					else:
+						debug (debugging.quite_verbose, lambda: "Found my seat!")
+						self.next_direction = None
+
+					if self.next_direction and self.location != self.target and self.location.connectors [self.next_direction]:
+						if self.location.connectors [self.next_direction].available ():
+							#
+							# This is the simplest case. The cell that we want to move into is available.
+							#
+
+							if self.location.is_aisle ():
+								delay = self.AS ()
+							else:
+								delay = self.SS ()
+
+							self.personal_delay_counter += delay
+							step_counters.current [step_counters.seat_delay] += delay
+							self.borrowed_cells += [self.location]
+							self.location.connectors [self.next_direction].enter (self)
+						else:
+							#
+							# We need to figure out how many people we have to cross.
+							#
+
+							number_of_people_to_cross = self.location.travel_until_empty (self.next_direction) [0]
+							
+							if number_of_people_to_cross == 0:
+								#
+								# The adjacent cell is borrowed, so we must wait for it to clear.
+								#
+
+								self.needed_to_wait += 1
+								self.waiting_for = self.location.connectors [self.next_direction]
+								step_counters.current [step_counters.borrowed_cell_waits] += 1
+							else:
+								#
+								# If we can borrow a spot in the aisle, then do that.
+								# To pull off the borrowing part, we'll be in both places simultaneously. :)
+								#
+
+								next_cell = self.location.connectors [self.next_direction]
+								
+								if self.location.is_aisle ():
+									#
+									# Try to claim adjacency for the aisle so that we can get more space
+									# and avoid shuffling (not explcitly simulated).
+									#
+									
+									south_aisle_cell = self.location.connectors [directions.south]
+
+									#
+									# We end up past the one person we're crossing (that cell may be borrowed,
+									# which is possible because travel_until_empty stops when it hits a borrowed
+									# or empty cell), or in our seat past two: no seat is farther than three away
+									# from the aisle. Nothing is drawn until that cell is free, so a failed
+									# attempt is only a wait on it. (The shuffle delay below used to be drawn
+									# on every attempt, so earlier versions gave different boarding times
+									# wherever a crossing was blocked.)
+									#
+
+									if number_of_people_to_cross == 1:
+										crossing_to = next_cell.connectors [self.next_direction]
+									else:
+										crossing_to = self.target
+
+									if number_of_people_to_cross > 2:
+										debug (debugging.error, lambda: "%s: Too many people to handle crossing process" % str (self.location))
+									elif not crossing_to.available ():
+										self.needed_to_wait += 1
+										self.waiting_for = crossing_to
+										step_counters.current [step_counters.crossing_waits] += 1
+									else:
+										if south_aisle_cell and south_aisle_cell.available ():
+											#
+											# We have more space to work with, so we can save some time.
+											#
+
+											mandatory_delay = 0
+										else:
+											#
+											# Simulate some aisle-shuffling that would take extra time.
+											#
+
+											mandatory_delay = self.AA () + self.AA ()
+
+										self.borrowed_cells += [self.location]
+
+										if south_aisle_cell and south_aisle_cell.available ():
+											self.borrowed_cells += [south_aisle_cell]
+											south_aisle_cell.current_occupant = self
+
+										if number_of_people_to_cross == 1:
+											mandatory_delay += max (self.AA (), self.SS ()) + self.AS () + max (self.SS (), self.AS ())
+											self.personal_delay_counter += mandatory_delay
+											next_cell.current_occupant.add_delay (mandatory_delay)
+											crossing_to.enter (self)
+											step_counters.current [step_counters.seat_delay] += mandatory_delay
+											step_counters.current [step_counters.one_person_crossings] += 1
+										else:
+											mandatory_delay += max (self.AA (), self.SA (), self.SS ()) + \
+													self.SA () + self.AS () + max (self.SA (), self.SS ()) + \
+													max (self.SS (), self.SS (), self.AS ())
+											self.personal_delay_counter += mandatory_delay
+											next_cell.current_occupant.add_delay (mandatory_delay)
+											next_cell.connectors [self.next_direction].current_occupant.add_delay (mandatory_delay)
+											crossing_to.enter (self)
+											step_counters.current [step_counters.seat_delay] += mandatory_delay
+											step_counters.current [step_counters.two_person_crossings] += 1
+
+								else:
+									#
+									# Use the simple function for the number of spots to cross mid-seat.
+									# First, though, we need the aisle to be available so that we can swap.
+									#
+								
+									aisle_cell = self.location.connectors [opposite (self.next_direction)]
+								
+									if aisle_cell.available () and self.target.available () and \
+											next_cell.current_occupant.delay_remaining () == 0:
+										aisle_cell.current_occupant = self
+										self.borrowed_cells += [aisle_cell, self.location]
+										mandatory_delay = max (self.SA (), self.SS ()) + self.SA () + self.AS () + max (self.SS (), self.AS ())
+										delay = mandatory_delay + self.SS ()
+										self.personal_delay_counter += delay
+										next_cell.current_occupant.add_delay (mandatory_delay + self.SS ())
+										self.target.enter (self)
+										step_counters.current [step_counters.seat_delay] += delay
+										step_counters.current [step_counters.mid_seat_crossings] += 1
+									else:
+										#
+										# Only the cells are worth waiting on; if it's the person we're crossing
+										# who is still busy, we try again next time.
+										#
+
+										self.needed_to_wait += 1
+										step_counters.current [step_counters.crossing_waits] += 1
+
+										if not aisle_cell.available ():
+											self.waiting_for = aisle_cell
+										elif not self.target.available ():
+											self.waiting_for = self.target
+
+class seat_route:
+	#
+	# Everything about getting to a seat that doesn't change from one trial to the
+	# next: the file of the aisle its passenger walks down (the closest one by file,
+	# which isn't always the one nearest_aisle () finds) and that aisle's place
+	# among the aisles counting from the west, how many seats there are between it
+	# and its nearest aisle, and the luggage bin they use. None of it depends on
+	# which door the passenger comes in by.
+	#
+
+	def __init__ (self, seat, aisles_on_plane):
+		self.aisle_file = min ([[abs (a.file - seat.file), a.file] for a in aisles_on_plane]) [1]
+		self.aisle_distance = seat.nearest_aisle () [0]
+
+		#
+		# The bin is the one over the aisle cell in the seat's row where boarder.step
+		# turns off towards the seat: the row's cell in the aisle that aisle_file's
+		# aisle leads into. That is the aisle with the same place from the west, which
+		# in the back section of a combined_plane_geometry can be in another file.
+		#
+
+		self.aisle_place = sorted ([a.file for a in aisles_on_plane]).index (self.aisle_file)
+		self.luggage_bin = row_aisle_cells (seat) [self.aisle_place].nearest_luggage_bin
+
+def row_aisle_cells (cell):
+	#
+	# The aisle cells in cell's row, from west to east.
+	#
+
+	while cell.connectors [directions.west]:
+		cell = cell.connectors [directions.west]
+
+	aisle_cells = []
+
+	while cell:
+		if cell.is_aisle ():
+			aisle_cells += [cell]
+
+		cell = cell.connectors [directions.east]
+
+	return aisle_cells
+
+def build_routes (passengers):
+	#
+	# Done once when a plane is built; since planes are reused as templates (see
+	# plane_from_template), every trial on them shares the same routes, and the same
+	# loader plans (see planned_shuffle).
+	#
+
+	loader_plans = {}
+
+	for p in passengers:
+		p.target.route = seat_route (p.target, p.aisles_on_plane)
+		p.closest_aisle = p.target.route.aisle_file
+		p.loader_plans = loader_plans
+
+class luggage_bin:
+	def __init__ (self, bag_capacity, load_delay_function):
+		self.bag_capacity = bag_capacity
+		self.current_load = 0
+		self.delay = load_delay_function
+
+	def load_one_bag (self):
+		self.current_load += 1
+		return self.delay (self.current_load, self.bag_capacity)
+
+	def load_delay (self, additional_load):
+		return sum ([self.load_one_bag () for i in range (additional_load)])
+
+	def reset (self, load_delay_function):
+		self.current_load = 0
+		self.delay = load_delay_function
+		
+class aisle:
+	#
+	# An aisle is just the collection of nodes that makes up the
+	# aisle portion of an aircraft. It does not include any seats.
+	# Seats are added by using add_window_row and add_bridge_row.
+	#
+	
+	def __init__ (self, rows, file, bin_capacity, bin_load_delay_function, bin_row_span):
+		last_bin = luggage_bin (bin_capacity, bin_load_delay_function)
+		self.bins = [last_bin]
+		self.head = node (0, file, last_bin)
+		self.file = file
+		self.nodes = self.head,
+		self.rows = rows
+		p = self.head
+		last_bin_row = 1
+		
+		#
+		# The rows will go from 0 to rows - 1, inclusive.
+		# I'm using 1..rows because this translates to 1..rows - 1, and we
+		# added the zero row above.
+		#
+
+		for i in range (1, rows):
+			if i > last_bin_row + bin_row_span - 1:
+				last_bin = luggage_bin (bin_capacity, bin_load_delay_function)
+				self.bins += [last_bin]
+				last_bin_row = i
+
+			n = node (i, file, last_bin)
+			p.connect (directions.south, n)
+			self.nodes += n,
+			p = n
+
+		self.tail = n
+
+	def add_window_row (self, row, direction, files, major_file):
+		#
+		# Returns the window seat.
+		#
+		
+		base = self.nodes [row]
+		
+		for i in range (files):
+			base = base.connect (direction, node (row, self.file + (i+1) * ordinal (direction), None))
+			base.major_file = major_file
+
+		return base
+
+	def add_bridge_row (self, bridged_aisle, row, direction, files, major_file):
+		#
+		# Returns the seat in the bridged aisle to which this aisle connects.
+		#
+
+		return self.add_window_row (row, direction, files, major_file).connect ( \
+				direction, bridged_aisle.nodes [row])
+
+class grid_plane_geometry:
+	def __init__ (self, rows, file_count_list, \
+			row_select_function, number_of_bags_function, SS, AS, SA, AA, bin_capacity, \
+			bin_load_delay_function, bin_row_span, routes = True):
+		#
+		# A section that is to be part of a combined_plane_geometry is built with routes
+		# False, and the combined plane works out its routes once the aisles are joined.
+		#
+
+		#
+		# Build the aisles at the appropriate files. The reason I'm subtracting one
+		# is because there are three file widths here, and only two aisles:
+		#
+		#   3   3   4
+		#  SSS|SSS|SSSS
+		#  SSS|SSS|SSSS
+		#
+		#    ...
+		#
+
+		self.aisles = [aisle (rows + 1, sum (file_count_list [0:i+1]) + i, \
+				bin_capacity, bin_load_delay_function, bin_row_span) \
+				for i in range (len (file_count_list) - 1)]
+
+		self.file_count_list = file_count_list
+		self.start_location = self.aisles [0].head
+		self.passengers = []
+		self.rows = rows + 1
+
+		#
+		# Create the bridge for the first row. There won't be passengers here, just some nodes
+		# to allow them to cross.
+		#
+
+		for aisle_index in range (1, len (self.aisles)):
+			self.aisles [aisle_index - 1].add_bridge_row ( \
+				self.aisles [aisle_index], 0, directions.east, file_count_list [aisle_index], aisle_index)
+
+		for row in range (1, rows + 1):
+			#
+			# First, connect all of the aisles together east-west.
+			#
+
+			self.aisles [0].add_window_row (row, directions.west, file_count_list [0], 0)
+
+			for aisle_index in range (1, len (self.aisles)):
+				self.aisles [aisle_index - 1].add_bridge_row ( \
+					self.aisles [aisle_index], row, directions.east, file_count_list [aisle_index], aisle_index)
+
+			self.aisles [len (self.aisles) - 1].add_window_row (row, directions.east, file_count_list [len (file_count_list) - 1], len (self.aisles))
+
+			#
+			# Next, put a passenger in each seat.
+			# However, we're using the filter-lambda combination to eliminate aisle seats
+			# from that list (those being ones with north or south connections).
+			#
+
+			self.passengers += [boarder (boarder.pre_boarding, x, number_of_bags_function (), \
+					self.aisles, SS, AS, SA, AA) \
+					for x in filter (lambda cell: not (cell.connectors [directions.north] or cell.connectors [directions.south]), \
+						self.row (row))]
+
+		self.cells = [cell for row in range (self.rows) for cell in self.row (row)]
+		self.luggage_bins = [b for a in self.aisles for b in a.bins]
+
+		#
+		# Now, re-index all of the passengers.
+		#
+
+		for i in range (len (self.passengers)):
+			self.passengers [i].sequence_identifier = i
+
+		self.all_passengers = tuple (self.passengers)
+
+		if routes:
+			build_routes (self.passengers)
+
+		fit_doors (self, [self.start_location], first_door_policy)
+
+	def reset (self, number_of_bags_function, bin_load_delay_function, SS, AS, SA, AA):
+		#
+		# Empties the plane and gives every passenger a new bag count and new delay
+		# functions, in the same order that the constructor does, so a reset plane is
+		# indistinguishable from a newly built one. Simulations remove passengers from
+		# self.passengers, so that list is rebuilt as well.
+		#
+
+		for cell in self.cells:
+			cell.current_occupant = None
+
+		for b in self.luggage_bins:
+			b.reset (bin_load_delay_function)
+
+		for p in self.all_passengers:
+			p.reset (number_of_bags_function (), SS, AS, SA, AA)
+
+		self.passengers = list (self.all_passengers)
+
+	def row (self, index):
+		return self.aisles [0].nodes [index].shoot_off (directions.west).trail (directions.east)
+
+	def __str__ (self):
+		s = ""
+		for i in range (self.rows):
+			for cell in self.row (i):
+				s += str (cell)
+			s += "\n"
+		return s
+
+	def compact_representation (self):
+		s = ""
+		for i in range (self.rows):
+			for cell in self.row (i):
+				s += cell.compact_representation ()
+			s += "\n"
+		return s
+
+	#
+	# The plane classes mix in an entrance manager to say where passengers come on;
+	# a geometry on its own (a compiled layout, say) boards them at start_location.
+	#
+
+	def board (self, passenger):
+		self.start_location.enter (passenger)
+
+	def available (self):
+		return self.start_location.available ()
+
+class two_floor_plane_geometry:
+	#
+	# Two decks, each boarding on its own: lower-deck passengers come on through the
+	# lower deck's doors, and upper-deck passengers queue for the stairs, which
+	# come out at the upper deck's start_location (see stair_door; climbing them
+	# takes floor_change_time_function (), or a seat move if that is None). Neither
+	# queue holds up the other.
+	#
+
+	upper_floor = "upper"
+	lower_floor = "lower"
+
+	def __init__ (self, lower_geometry, upper_geometry, floor_change_time_function, stair_capacity = 4):
+		self.lower_geometry = lower_geometry
+		self.upper_geometry = upper_geometry
+		self.floor_change_time_function = floor_change_time_function
+		self.passengers = lower_geometry.passengers + upper_geometry.passengers
+		self.start_location = lower_geometry.start_location
+		self.rows = lower_geometry.rows
+		self.cells = lower_geometry.cells + upper_geometry.cells
+		self.luggage_bins = lower_geometry.luggage_bins + upper_geometry.luggage_bins
+
+		#
+		# Change the floors of each geometry.
+		#
+
+		for row in range (lower_geometry.rows):
+			for cell in lower_geometry.row (row):
+				cell.floor = two_floor_plane_geometry.lower_floor
+
+		for row in range (upper_geometry.rows):
+			for cell in upper_geometry.row (row):
+				cell.floor = two_floor_plane_geometry.upper_floor
+
+		self.stairs = stair_door (upper_geometry.start_location, stair_capacity, floor_change_time_function)
+		self.doors = lower_geometry.doors + [self.stairs]
+		self.door_policy = deck_door_policy (lower_geometry.door_policy)
+
+	def reset (self, number_of_bags_function, bin_load_delay_function, SS, AS, SA, AA):
+		self.lower_geometry.reset (number_of_bags_function, bin_load_delay_function, SS, AS, SA, AA)
+		self.upper_geometry.reset (number_of_bags_function, bin_load_delay_function, SS, AS, SA, AA)
+		self.passengers = self.lower_geometry.passengers + self.upper_geometry.passengers
+
+	def board (self, passenger):
+		self.door_policy (passenger, self.doors).board (passenger)
+
+	def available (self):
+		return len ([d for d in self.doors if d.available ()]) > 0
+
+	def compact_representation (self):
+		return "Upper floor:\n" + self.upper_geometry.compact_representation () + \
+			   "\nLower floor:\n" + self.lower_geometry.compact_representation ()
+
+class combined_plane_geometry:
+	def __init__ (self, north_geometry, south_geometry, binding_function = \
+			lambda north, south: [north.aisles [x].tail.connect (directions.south, south.aisles [x].head) \
+				for x in range (len (north.aisles))]):
+
+		self.passengers = [p for p in north_geometry.passengers + south_geometry.passengers]
+		self.rows = north_geometry.rows + south_geometry.rows
+		self.aisles = north_geometry.aisles
+
+		self.north_geometry = north_geometry
+		self.south_geometry = south_geometry
+		self.start_location = north_geometry.start_location
+		self.cells = north_geometry.cells + south_geometry.cells
+		self.luggage_bins = north_geometry.luggage_bins + south_geometry.luggage_bins
+
+		#
+		# Add the new sequencing index to the south group of passengers.
+		# Also, properly set their aisle knowledge.
+		#
+
+		max_in_north = max ([p.sequence_identifier for p in north_geometry.passengers])
+		for p in south_geometry.passengers:
+			p.sequence_identifier += max_in_north
+			p.aisles_on_plane = north_geometry.aisles
+
+		#
+		# Also, update the row indices appropriately.
+		# To do this, we'll just bump them up by the number of rows in the northern part.
+		#
+
+		for row_index in range (south_geometry.rows):
+			for n in south_geometry.row (row_index):
+				n.row += north_geometry.rows
+
+		binding_function (north_geometry, south_geometry)
+
+		#
+		# The sections are built without routes (see grid_plane_geometry), since the
+		# south part's passengers find their way by the north part's aisles.
+		#
+
+		build_routes (self.passengers)
+		fit_doors (self, [self.start_location], first_door_policy)
+
+	def reset (self, number_of_bags_function, bin_load_delay_function, SS, AS, SA, AA):
+		self.north_geometry.reset (number_of_bags_function, bin_load_delay_function, SS, AS, SA, AA)
+		self.south_geometry.reset (number_of_bags_function, bin_load_delay_function, SS, AS, SA, AA)
+		self.passengers = self.north_geometry.passengers + self.south_geometry.passengers
+
+	def row (self, index):
+		if index < self.north_geometry.rows:
+			return self.north_geometry.row (index)
+		else:
+			return self.south_geometry.row (index - self.north_geometry.rows)
+
+	def __str__ (self):
+		return str (self.north_geometry) + "\n\n" + str (self.south_geometry)
+
+	def compact_representation (self):
+		return self.north_geometry.compact_representation () + "\n\n" + self.south_geometry.compact_representation ()
+
+	def board (self, passenger):
+		self.start_location.enter (passenger)
+
+	def available (self):
+		return self.start_location.available ()
+
+#
+# Doors
+#
+# Every plane has a list of doors, each with its own queue, and a door policy,
+# which is called with a passenger and the doors and says which door they queue
+# at. The simulations board one passenger at each door that is clear, so a plane
+# with two doors can take two passengers in the same tick.
+#
+# A passenger walks from their door along its row to their aisle and then up or
+# down the aisle to their row. Only the front row runs across the plane, so a door
+# anywhere else can only serve passengers in its own aisle. A policy should also
+# never send two passengers into the same stretch of aisle from opposite ends:
+# they would wait for each other for ever.
+#
+# Aisles are matched by their place among the aisles counting from the west (a
+# door's aisle, and a seat_route's aisle_place), since the back section of a
+# combined_plane_geometry can have an aisle in a different file from the front.
+#
+
+class door:
+	def __init__ (self, cell):
+		self.cell = cell
+		self.queue = deque ()
+		self.next_boarding = 0
+		self.aisle = None
+
+		if cell.is_aisle ():
+			self.aisle = row_aisle_cells (cell).index (cell)
+
+	def reset (self):
+		self.queue.clear ()
+		self.next_boarding = 0
+
+	def available (self):
+		return self.cell.available ()
+
+	def board (self, passenger):
+		passenger.closest_aisle = self.aisle_file (passenger)
+		self.cell.enter (passenger)
+
+	def aisle_file (self, passenger):
+		#
+		# The file in which the passenger finds their aisle, walking along the door's
+		# row: the door's own, if it is on their aisle.
+		#
+
+		if self.aisle == passenger.target.route.aisle_place:
+			return self.cell.file
+
+		return passenger.target.route.aisle_file
+
+	def board_next (self, time, boarding_delay_function):
+		#
+		# Called by the simulations once a tick. Boards the next passenger in the
+		# queue and returns them, if the door can take one at time.
+		#
+
+		if len (self.queue) > 0 and self.available () and time > self.next_boarding:
+			passenger = self.queue.popleft ()
+			self.board (passenger)
+			self.next_boarding = time + boarding_delay_function ()
+			return passenger
+
+		return None
+
+	def ready_after (self):
+		#
+		# The time after which board_next will next do something, or None if it has
+		# to wait for someone to clear the door first.
+		#
+
+		if len (self.queue) > 0 and self.available ():
+			return self.next_boarding
+
+		return None
+
+class stair_door (door):
+	#
+	# The stairs up to another deck. Passengers queue at the foot and step on one
+	# boarding delay apart while there are fewer than capacity of them on the
+	# stairs. Each takes climb () to get up (or, if climb is None, as long as
+	# moving one seat: their own SS ()), and they come off in the order they got
+	# on, onto cell, once it is clear.
+	#
+
+	def __init__ (self, cell, capacity, climb):
+		door.__init__ (self, cell)
+		self.capacity = capacity
+		self.climb = climb
+		self.riders = deque ()
+
+	def reset (self):
+		door.reset (self)
+		self.riders.clear ()
+
+	def board_next (self, time, boarding_delay_function):
+		passenger = None
+
+		if len (self.riders) > 0 and time > self.riders [0][0] and self.available ():
+			passenger = self.riders.popleft () [1]
+			self.board (passenger)
+
+		if len (self.queue) > 0 and len (self.riders) < self.capacity and time > self.next_boarding:
+			climber = self.queue.popleft ()
+
+			if self.climb:
+				self.riders.append ((time + self.climb (), climber))
+			else:
+				self.riders.append ((time + climber.SS (), climber))
+
+			self.next_boarding = time + boarding_delay_function ()
+
+		return passenger
+
+	def ready_after (self):
+		times = []
+
+		if len (self.riders) > 0 and self.available ():
+			times += [self.riders [0][0]]
+
+		if len (self.queue) > 0 and len (self.riders) < self.capacity:
+			times += [self.next_boarding]
+
+		if len (times):
+			return min (times)
+
+		return None
+
+class jet_bridge (door):
+	#
+	# A gate and a jet bridge in front of a cabin door. Passengers queue at the gate,
+	# where the agent takes scan () to check each of them (or a boarding delay, if
+	# scan is None), and then walk the length of the bridge at walking_speed () and
+	# wait at the far end for the door's cell to clear. There is room on the bridge
+	# for capacity passengers; when it is full, the agent has to stop scanning until
+	# someone steps into the cabin. Without overtaking, nobody reaches the door
+	# before the person scanned ahead of them.
+	#
+	# The time the agent spends scanning and blocked, and the time passengers spend
+	# walking and held at the door, are added to step_counters as it goes.
+	#
+
+	def __init__ (self, cell, length, capacity, walking_speed, scan = None, overtaking = False):
+		door.__init__ (self, cell)
+		self.length = length
+		self.capacity = capacity
+		self.walking_speed = walking_speed
+		self.scan = scan
+		self.overtaking = overtaking
+		self.walkers = []
+		self.scanned = 0
+		self.last_arrival = 0
+		self.full_since = None
+
+	def reset (self):
+		door.reset (self)
+		self.walkers = []
+		self.scanned = 0
+		self.last_arrival = 0
+		self.full_since = None
+
+	def board_next (self, time, boarding_delay_function):
+		#
+		# walkers is a heap of (arrival, scan number, passenger). Without overtaking,
+		# arrivals never go down in scan order, so the heap is first come, first served.
+		#
+
+		passenger = None
+		counters = step_counters.current
+
+		if len (self.walkers) > 0 and time > self.walkers [0][0] and self.available ():
+			arrival, number, passenger = heappop (self.walkers)
+			self.board (passenger)
+			counters [step_counters.bridge_held] += time - arrival
+
+			if self.full_since != None:
+				#
+				# The queue can't have been refilled while the bridge was full (the
+				# simulations wait for everyone queued to board first), so if it isn't
+				# empty now, the agent was held up for as long as it has been.
+				#
+
+				if len (self.queue) > 0:
+					counters [step_counters.gate_blocked] += max (0, time - max (self.full_since, self.next_boarding))
+
+				self.full_since = None
+
+		if len (self.queue) > 0 and len (self.walkers) < self.capacity and time > self.next_boarding:
+			walker = self.queue.popleft ()
+
+			if self.scan:
+				scan = self.scan ()
+			else:
+				scan = boarding_delay_function ()
+
+			#
+			# The walk starts once the scan is over. A normal draw can come out at or
+			# below zero; nobody walks slower than a tenth of a unit of length per unit
+			# of time.
+			#
+
+			arrival = time + scan + self.length / max (self.walking_speed (), 0.1)
+
+			if not self.overtaking:
+				arrival = max (arrival, self.last_arrival)
+
+			counters [step_counters.gate_busy] += scan
+			counters [step_counters.bridge_walk] += arrival - (time + scan)
+
+			heappush (self.walkers, (arrival, self.scanned, walker))
+			self.scanned += 1
+			self.last_arrival = arrival
+			self.next_boarding = time + scan
+
+			if len (self.walkers) == self.capacity:
+				self.full_since = time
+
+		return passenger
+
+	def ready_after (self):
+		times = []
+
+		if len (self.walkers) > 0 and self.available ():
+			times += [self.walkers [0][0]]
+
+		if len (self.queue) > 0 and len (self.walkers) < self.capacity:
+			times += [self.next_boarding]
+
+		if len (times):
+			return min (times)
+
+		return None
+
+def fit_jet_bridges (plane, r, settings):
+	#
+	# Puts a gate and jet bridge in front of each of plane's doors (but not its
+	# stairs), or with settings None takes them away again. settings has the
+	# bridges' length, capacity and overtaking, and the (mean, standard deviation)
+	# of the walking speed and of the scan time (or None for the boarding delay),
+	# which are drawn from r.
+	#
+
+	if not hasattr (plane, 'cabin_doors'):
+		plane.cabin_doors = plane.doors
+
+	if settings == None:
+		plane.doors = plane.cabin_doors
+		return
+
+	gauss = lambda distribution: lambda: r.gauss (distribution [0], distribution [1])
+	scan = settings ['scan'] and gauss (settings ['scan']) or None
+
+	plane.doors = [d.__class__ is door and jet_bridge (d.cell, settings ['length'], settings ['capacity'], \
+			gauss (settings ['walking_speed']), scan, settings ['overtaking']) or d for d in plane.cabin_doors]
+
+def fit_doors (plane, cells, door_policy):
+	plane.doors = [door (cell) for cell in cells]
+	plane.door_policy = door_policy
+
+def first_door_policy (passenger, doors):
+	return doors [0]
+
+def nearest_door_policy (passenger, doors):
+	#
+	# The door that can reach the passenger's aisle (see above) nearest to their
+	# row, the first one listed on a tie. Passengers in an aisle that is served from
+	# both ends are split at one row, so the two streams never meet.
+	#
+
+	best = None
+	best_distance = None
+
+	for d in doors:
+		if d.cell.row == 0 or d.aisle == passenger.target.route.aisle_place:
+			distance = abs (d.cell.row - passenger.target.row)
+
+			if best == None or distance < best_distance:
+				best = d
+				best_distance = distance
+
+	return best or doors [0]
+
+door_policies = {"first": first_door_policy, "nearest": nearest_door_policy}
+
+class deck_door_policy:
+	#
+	# For two_floor_plane_geometry, whose last door is the stairs to the upper deck:
+	# upper-deck passengers take the stairs, and everyone else the door that the
+	# lower deck's own policy picks. (An object rather than a closure, so that
+	# planes can be pickled; see compiled_layout.)
+	#
+
+	def __init__ (self, lower_policy):
+		self.lower_policy = lower_policy
+
+	def __call__ (self, passenger, doors):
+		if passenger.target.floor == two_floor_plane_geometry.upper_floor:
+			return doors [-1]
+
+		return self.lower_policy (passenger, doors [:-1])
+
+class multiple_entrance_manager:
+	def __init__ (self, entrances, door_policy = nearest_door_policy):
+		fit_doors (self, entrances, door_policy)
+
+	def board (self, person):
+		self.door_policy (person, self.doors).board (person)
+
+	def available (self):
+		return len ([d for d in self.doors if d.available ()]) > 0
+
+class single_entrance_manager:
+	def __init__ (self, entrance):
+		self.entrance = entrance
+		fit_doors (self, [entrance], first_door_policy)
+
+	def board (self, person):
+		self.entrance.enter (person)
+
+	def available (self):
+		return self.entrance.current_occupant == None
+
+class simulation:
+	def __init__ (self, plane, boarding_function):
+		self.plane = plane
+		self.boarding_function = boarding_function
+
+	def reset_doors (self):
+		for d in self.plane.doors:
+			d.reset ()
+
+		return self.plane.doors
+
+	def enqueue (self, passengers, currently_unboarded):
+		#
+		# Queues passengers at their doors, in order, and takes them out of
+		# currently_unboarded. Returns how many there were.
+		#
+
+		enqueued = set ()
+
+		for passenger in passengers:
+			self.plane.door_policy (passenger, self.plane.doors).queue.append (passenger)
+			enqueued.add (id (passenger))
+
+		#
+		# Same effect as removing each queued passenger in turn, but in one pass.
+		#
+
+		currently_unboarded [:] = [p for p in currently_unboarded if id (p) not in enqueued]
+		return len (enqueued)
+
+	def run (self, passenger_selector_function = lambda p: True, boarding_delay_function = lambda: 8, time_step = 1):
+		#
+		# Afterwards, ticks is the number of iterations and passenger_steps the number
+		# of times a passenger was stepped (these are what the benchmark counts).
+		#
+
+		time = 0
+		iterations = 0
+		passenger_steps = 0
+
+		#
+		# Everything that is only wanted when tracing is checked once here, so that the
+		# loop doesn't make messages (or closures for them) that won't be printed.
+		#
+
+		trace = debugging.trace
+		verbose = debugging.current_debug >= debugging.quite_verbose
+		pictures = verbose and debugging.tracing
+
+		if trace:
+			trace.begin (self.plane, time_step)
+
+		step_counters.current = [0] * len (step_counters.names)
+
+		debug (debugging.status, lambda: "Beginning simulation...")
+		debug (debugging.not_looped, lambda: str (self.plane) + "\n")
+
+		currently_unboarded = self.plane.passengers
+		currently_unfinished = []
+
+		doors = self.reset_doors ()
+		queued = 0
+
+		while len (currently_unfinished) or len (currently_unboarded) > 0 or queued > 0:
+			iterations += 1
+
+			if pictures:
+				debug (debugging.quite_verbose, lambda: self.plane.compact_representation () + "\n" + str (int (time)) + "\n")
+
+			if queued == 0 and len (currently_unboarded) > 0:
+				#
+				# The boarding function is used so that we can choose to board people in
+				# stages; for example, we may want to board first-class first and then let
+				# everyone else file in randomly.
+				#
+
+				queued = self.enqueue (self.boarding_function (time, currently_unboarded), currently_unboarded)
+
+				if verbose:
+					debug (debugging.quite_verbose, lambda: "Enqueued %d person(s)" % queued)
+			elif verbose:
+				debug (debugging.quite_verbose, lambda: "")
+
+			#
+			# Each door that is clear takes the next passenger in its queue.
+			#
+
+			boarded = False
+
+			for d in doors:
+				passenger = d.board_next (time, boarding_delay_function)
+
+				if passenger:
+					if verbose:
+						debug (debugging.quite_verbose, lambda: "Plane: Boarding one person")
+
+					#
+					# Add this passenger to the "unfinished" list; the door has already put
+					# them on the plane and set the delay before it takes the next person.
+					#
+
+					queued -= 1
+					currently_unfinished += [passenger]
+					boarded = True
+
+					if trace:
+						trace.record (time + time_step, "board", passenger, passenger.location)
+
+			if not boarded and verbose:
+				debug (debugging.quite_verbose, lambda: "")
+
+			time += time_step
+			passenger_steps += len (currently_unfinished)
+
+			delete_necessary = False
+			for p in currently_unfinished:
+				p.personal_delay_counter -= time_step
+				
+				if p.personal_delay_counter < 0:
+					p.personal_delay_counter = 0
+
+				if trace:
+					before = trace.before (p)
+					p.step ()
+					trace.observe (time, p, before)
+				else:
+					p.step ()
+
+				if p.finished ():
+					delete_necessary = True
+			
+			if delete_necessary:
+				#
+				# This used to remove finished passengers from the list while iterating
+				# over it, which skips the passenger just after each one removed; they
+				# stay on for another iteration. Boarding times depend on that, so the
+				# single pass below keeps it.
+				#
+
+				remaining = []
+				skip_next = False
+
+				for p in currently_unfinished:
+					if skip_next:
+						remaining += [p]
+						skip_next = False
+					elif p.finished ():
+						skip_next = True
+					else:
+						remaining += [p]
+
+				currently_unfinished = remaining
+
+		if trace:
+			trace.end (time)
+
+		self.ticks = iterations
+		self.passenger_steps = passenger_steps
+		self.counters = step_counters.current
+		return time
+
+class event_driven_simulation (simulation):
+	#
+	# This runs the same model as simulation.run, but it doesn't visit passengers
+	# who have nothing to do. Someone who is counting down their delay is in a
+	# priority queue under the iteration at which the counter runs out, and someone
+	# who is blocked on a cell (the next one along, or the one they'd cross into) is
+	# parked on that cell until it is released. The rest (people who are about to
+	# sit down, or who are waiting for the person they want to cross mid-seat to
+	# finish what they're doing) are revisited on the next iteration, just as the
+	# time-step loop would.
+	#
+	# Events are ordered by (iteration, boarding order), which is the order in
+	# which the time-step loop visits passengers, so when the time step is a power
+	# of two the two engines produce identical boarding times on a fixed seed.
+	# Nobody has more than one event queued: a boarder is either in the queue,
+	# parked (their waiting_for is set), or being stepped.
+	#
+
+	def run (self, passenger_selector_function = lambda p: True, boarding_delay_function = lambda: 8, time_step = 1):
+		self.time_step = time_step
+		self.iteration = 0
+		self.current_order = -1
+		self.events = []
+		self.waiters = {}
+		self.unfinished_orders = []
+
+		boarded_count = 0
+		passenger_steps = 0
+
+		trace = debugging.trace
+		verbose = debugging.current_debug >= debugging.quite_verbose
+		pictures = verbose and debugging.tracing
+
+		if trace:
+			trace.begin (self.plane, time_step)
+
+		step_counters.current = [0] * len (step_counters.names)
+
+		debug (debugging.status, lambda: "Beginning event-driven simulation...")
+		debug (debugging.not_looped, lambda: str (self.plane) + "\n")
+
+		currently_unboarded = self.plane.passengers
+		doors = self.reset_doors ()
+		queued = 0
+
+		events = self.events
+		waiters = self.waiters
+		step_size = float (time_step)
+
+		while len (self.unfinished_orders) or len (currently_unboarded) > 0 or queued > 0:
+			#
+			# Figure out the next iteration in which anything can happen. Boarding
+			# can't happen while a door is occupied, and a door can only be cleared by
+			# a passenger event, so we recheck them after each one.
+			#
+
+			iteration = self.iteration
+			next_iteration = None
+
+			if len (events):
+				next_iteration = events [0][0]
+
+			boarding_iteration = None
+
+			if queued == 0 and len (currently_unboarded) > 0:
+				boarding_iteration = iteration + 1
+			else:
+				for d in doors:
+					ready_after = d.ready_after ()
+
+					if ready_after != None:
+						door_iteration = max (iteration + 1, self.first_iteration_after (ready_after))
+
+						if boarding_iteration == None or door_iteration < boarding_iteration:
+							boarding_iteration = door_iteration
+
+			if boarding_iteration != None and (next_iteration == None or boarding_iteration < next_iteration):
+				next_iteration = boarding_iteration
+
+			if next_iteration == None:
+				debug (debugging.error, lambda: "Event-driven simulation: nobody can move at iteration %d" % iteration)
+				break
+
+			self.iteration = iteration = next_iteration
+			self.current_order = -1
+			time = (iteration - 1) * time_step
+
+			if pictures:
+				debug (debugging.quite_verbose, lambda: self.plane.compact_representation () + "\n" + str (int (time)) + "\n")
+
+			if queued == 0 and len (currently_unboarded) > 0:
+				queued = self.enqueue (self.boarding_function (time, currently_unboarded), currently_unboarded)
+
+				if verbose:
+					debug (debugging.quite_verbose, lambda: "Enqueued %d person(s)" % queued)
+
+			for d in doors:
+				passenger = d.board_next (time, boarding_delay_function)
+
+				if passenger:
+					if verbose:
+						debug (debugging.quite_verbose, lambda: "Plane: Boarding one person")
+
+					queued -= 1
+
+					passenger.scheduler = self
+					passenger.event_order = boarded_count
+					passenger.delay_synchronized_at = iteration - 1
+					passenger.parked_at = None
+					self.unfinished_orders += [boarded_count]
+					boarded_count += 1
+
+					heappush (events, (iteration, passenger.event_order, passenger))
+
+					if trace:
+						trace.record (iteration * time_step, "board", passenger, passenger.location)
+
+			finishing = []
+
+			while len (events) and events [0][0] == iteration:
+				p = heappop (events) [2]
+				self.current_order = p.event_order
+
+				#
+				# This is synchronize (p), written out: p is the one being stepped, so its
+				# counter is brought up to the end of this iteration.
+				#
+
+				if iteration > p.delay_synchronized_at:
+					if p.personal_delay_counter != 0:
+						p.personal_delay_counter = max (0, p.personal_delay_counter - (iteration - p.delay_synchronized_at) * time_step)
+
+					p.delay_synchronized_at = iteration
+
+				if p.parked_at != None:
+					self.count_waits (p, iteration - 1 - p.parked_at)
+					p.parked_at = None
+
+					if trace:
+						trace.record (iteration * time_step, "wait", p, p.location)
+
+				if p.personal_delay_counter != 0:
+					heappush (events, (self.expiry (p), p.event_order, p))
+					continue
+
+				#
+				# Step replaces the list of borrowed cells rather than emptying it, so
+				# these are still the cells that p might be about to vacate.
+				#
+
+				location = p.location
+				borrowed_cells = p.borrowed_cells
+
+				if trace:
+					before = trace.before (p)
+					p.step ()
+					trace.observe (iteration * time_step, p, before)
+				else:
+					p.step ()
+
+				passenger_steps += 1
+
+				if len (waiters):
+					for cell in borrowed_cells:
+						if cell.current_occupant == None and cell in waiters:
+							self.release (cell)
+
+					if location.current_occupant == None and location in waiters:
+						self.release (location)
+
+				if p.personal_delay_counter != 0:
+					heappush (events, (iteration + max (1, int (ceil (p.personal_delay_counter / step_size))), p.event_order, p))
+				elif p.location == p.target:
+					finishing += [p]
+				elif p.waiting_for:
+					self.park (p)
+				else:
+					heappush (events, (iteration + 1, p.event_order, p))
+
+			self.current_order = -1
+
+			if len (finishing):
+				self.remove_finished (finishing)
+
+		if trace:
+			trace.end (self.iteration * time_step)
+
+		self.ticks = self.iteration
+		self.passenger_steps = passenger_steps
+		self.counters = step_counters.current
+		return self.iteration * time_step
+
+	def remove_finished (self, finishing):
+		#
+		# The time-step loop removes finished passengers from the list it is iterating
+		# over, so the passenger just after each one it removes gets skipped and stays
+		# on for another iteration. We do the same thing so that the two engines agree.
+		#
+		# Someone who sat down earlier in this iteration may also have been crossed
+		# since; they are still unfinished in that case, and go back in the queue.
+		#
+
+		removed = []
+
+		for p in finishing:
+			if not p.finished ():
+				heappush (self.events, (self.expiry (p), p.event_order, p))
+				continue
+
+			position = bisect_left (self.unfinished_orders, p.event_order)
+
+			if position > 0 and len (removed) and removed [-1] == self.unfinished_orders [position - 1]:
+				heappush (self.events, (self.iteration + 1, p.event_order, p))
+			else:
+				removed += [p.event_order]
+				p.scheduler = None
+
+		for order in removed:
+			del self.unfinished_orders [bisect_left (self.unfinished_orders, order)]
+
+	def first_iteration_after (self, boarding_time):
+		#
+		# Returns the first iteration whose starting time is strictly after boarding_time.
+		#
+
+		i = int (boarding_time / self.time_step)
+
+		while i * self.time_step > boarding_time:
+			i -= 1
+
+		while not i * self.time_step > boarding_time:
+			i += 1
+
+		return i + 1
+
+	def expiry (self, p):
+		return p.delay_synchronized_at + max (1, int (ceil (p.personal_delay_counter / float (self.time_step))))
+
+	def park (self, p):
+		#
+		# Parks p on the cell their step was blocked on. Their waits are added up when
+		# they wake, under the counter that the step used: the cell is next to them in
+		# their seat row if it was borrowed, and further along (or behind them) if they
+		# were trying to cross someone.
+		#
+
+		if p.seek_phase != boarder.find_seat:
+			p.parked_counter = step_counters.aisle_waits
+		elif p.waiting_for is p.location.connectors [p.next_direction]:
+			p.parked_counter = step_counters.borrowed_cell_waits
+		else:
+			p.parked_counter = step_counters.crossing_waits
+
+		p.parked_at = self.iteration
+		self.waiters.setdefault (p.waiting_for, []).append (p)
+
+	def release (self, cell):
+		#
+		# Wakes everyone parked on cell. An entry is out of date if its boarder has
+		# been woken since (by a delay) and is now waiting on something else, or not
+		# at all; their waiting_for tells us.
+		#
+
+		for p in self.waiters.pop (cell):
+			if p.waiting_for is cell:
+				p.waiting_for = None
+
+				if p.event_order > self.current_order:
+					heappush (self.events, (self.iteration, p.event_order, p))
+				else:
+					heappush (self.events, (self.iteration + 1, p.event_order, p))
+
+	def synchronize (self, p):
+		#
+		# Brings p's delay counter up to date with the current point in the iteration.
+		# The time-step loop will already have decremented it this iteration if p
+		# comes before the passenger currently being stepped.
+		#
+
+		if p.event_order <= self.current_order:
+			target = self.iteration
+		else:
+			target = self.iteration - 1
+
+		if target > p.delay_synchronized_at:
+			p.personal_delay_counter = max (0, p.personal_delay_counter - (target - p.delay_synchronized_at) * self.time_step)
+			p.delay_synchronized_at = target
+
+	def delay_changed (self, p):
+		#
+		# Someone crossed p and added to their delay. If p was parked on a cell they
+		# stop waiting for it and act again once the new delay runs out. Anyone with
+		# an event queued will find the delay when it comes up, and someone who has
+		# just sat down is requeued by remove_finished.
+		#
+
+		if p.waiting_for:
+			self.count_waits (p, p.delay_synchronized_at - p.parked_at)
+			p.parked_at = None
+			p.waiting_for = None
+			heappush (self.events, (self.expiry (p), p.event_order, p))
+
+	def count_waits (self, p, ticks):
+		p.needed_to_wait += ticks
+		step_counters.current [p.parked_counter] += ticks
+
+class vectorised_batch_simulation:
+	#
+	# Runs many trials of one plane and loader in lockstep, with the state of every
+	# trial held in NumPy arrays. The plane is compiled into tables indexed by cell
+	# number (neighbours, rows, files, kinds and luggage bins), and the boarding
+	# order of every trial is worked out up front by calling the loader the same
+	# way simulation.run does, so passengers are numbered by when they board.
+	#
+	# Each iteration, the passengers whose delay has run out are stepped in rounds:
+	# round k steps the k-th such passenger of every trial at once. Within a trial,
+	# passengers act in boarding order just as in simulation.run, but the random
+	# numbers are drawn differently (and the removal quirk of the time-step loop
+	# isn't copied), so the two only agree statistically; run_vectorised_comparison
+	# checks that they do.
+	#
+	# Delays are given as (mean, standard deviation) pairs rather than functions,
+	# since they are drawn for many trials at a time. bin_load_delay is the mean
+	# delay per bag, as for plane_generator.
+	#
+
+	north = 0
+	south = 1
+	east = 2
+	west = 3
+
+	def __init__ (self, plane, boarding_function, trial_count, seed, SS, AS, SA, AA, bin_load_delay, boarding_delay):
+		if numpy == None:
+			raise ImportError ("vectorised_batch_simulation needs NumPy")
+
+		self.SS = SS
+		self.AS = AS
+		self.SA = SA
+		self.AA = AA
+		self.bin_load_delay = bin_load_delay
+		self.boarding_delay = boarding_delay
+		self.trial_count = trial_count
+		self.random = numpy.random.RandomState (derive_seed (seed, "vectorised") % 2**32)
+
+		r = Random (seed)
+		randomness.shuffle_generator.seed (derive_seed (seed, "shuffle"))
+
+		template = plane_from_template (plane, r, None, None, None, None, bin_load_delay)
+		passengers = list (template.passengers)
+
+		self.compile_plane (template, passengers)
+		self.compile_boarding_orders (passengers, boarding_function)
+
+	def compile_plane (self, plane, passengers):
+		#
+		# Cell numbers index the plane's cells; one more number stands for "no cell"
+		# and is its own neighbour in every direction. It is never available, and the
+		# passenger number one past the last is its permanent (phantom) occupant.
+		#
+
+		cells = plane.cells
+		index = dict ([(cells [i], i) for i in range (len (cells))])
+		index [None] = len (cells)
+		self.no_cell = len (cells)
+
+		bins = {}
+		for cell in cells:
+			if cell.nearest_luggage_bin and cell.nearest_luggage_bin not in bins:
+				bins [cell.nearest_luggage_bin] = len (bins)
+
+		compass = (directions.north, directions.south, directions.east, directions.west)
+
+		self.neighbours = numpy.array ([[index [cell.connectors [d]] for d in compass] for cell in cells] + \
+				[[self.no_cell] * 4])
+		self.cell_row = numpy.array ([cell.row for cell in cells] + [-1])
+		self.cell_file = numpy.array ([cell.file for cell in cells] + [-1])
+		self.cell_is_aisle = numpy.array ([bool (cell.is_aisle ()) for cell in cells] + [False])
+		self.cell_bin = numpy.array ([bins.get (cell.nearest_luggage_bin, -1) for cell in cells] + [-1])
+		self.bin_count = len (bins)
+
+		#
+		# Each passenger boards through the door the plane's policy gives them. The
+		# capacity of an ordinary door is 0; stairs (see stair_door) hold passengers
+		# for a climb drawn like SS.
+		#
+
+		doors = plane.doors
+		self.door_cell = [index [d.cell] for d in doors]
+		self.door_capacity = [isinstance (d, stair_door) and d.capacity or 0 for d in doors]
+
+		if len ([d for d in doors if isinstance (d, stair_door) and d.climb]):
+			raise ValueError ("%s: the vectorised engine can only draw the climb up the stairs like SS" % plane.name)
+
+		self.passenger_target = numpy.array ([index [p.target] for p in passengers])
+		self.passenger_door = numpy.array ([doors.index (plane.door_policy (p, doors)) for p in passengers])
+		self.passenger_aisle = numpy.array ([doors [d].aisle_file (p) for p, d in zip (passengers, self.passenger_door)])
+
+	def compile_boarding_orders (self, passengers, boarding_function):
+		#
+		# The loader is refilled whenever the queue runs dry, so the boarding order is
+		# just the concatenation of its answers. It doesn't depend on what happens on
+		# the plane, so it can be fixed before the simulation starts.
+		#
+
+		number = dict ([(passengers [i], i) for i in range (len (passengers))])
+		orders = []
+		groups = []
+		group_sizes = []
+
+		for trial in range (self.trial_count):
+			currently_unboarded = list (passengers)
+			order = []
+			group = []
+			sizes = []
+
+			while len (currently_unboarded):
+				queue = list (boarding_function (0, currently_unboarded))
+				enqueued = set ([id (p) for p in queue])
+				currently_unboarded [:] = [p for p in currently_unboarded if id (p) not in enqueued]
+				order += [number [p] for p in queue]
+				group += [len (sizes)] * len (queue)
+				sizes += [len (queue)]
+
+			orders += [order]
+			groups += [group]
+			group_sizes += [sizes]
+
+		orders = numpy.array (orders)
+		self.passenger_count = len (passengers)
+
+		#
+		# The loader's answers are groups: nobody boards until everyone in the group
+		# before has (simulation.run only refills its queues once they are all empty).
+		# The phantom passenger is in a group that never comes.
+		#
+
+		self.group_size = numpy.zeros ((self.trial_count, max ([len (sizes) for sizes in group_sizes]) + 1), int)
+		for trial in range (self.trial_count):
+			self.group_size [trial, :len (group_sizes [trial])] = group_sizes [trial]
+
+		self.group = numpy.hstack ((numpy.array (groups), numpy.zeros ((self.trial_count, 1), int) + self.passenger_count))
+
+		#
+		# door_order [d] lists, for each trial, the boarding numbers of the passengers
+		# who use door d, in order, and then the phantom passenger.
+		#
+
+		door = self.passenger_door [orders]
+		self.door_order = []
+
+		for d in range (len (self.door_cell)):
+			self.door_order += [numpy.array ([list (numpy.flatnonzero (door [trial] == d)) + [self.passenger_count] \
+					for trial in range (self.trial_count)])]
+
+		#
+		# Everything below is indexed by (trial, boarding order), with a phantom
+		# passenger at the end who sits in the "no cell" cell.
+		#
+
+		phantom = numpy.zeros ((self.trial_count, 1), int)
+		self.target = numpy.hstack ((self.passenger_target [orders], phantom + self.no_cell))
+		self.target_row = self.cell_row [self.target]
+		self.target_file = self.cell_file [self.target]
+		self.closest_aisle = numpy.hstack ((self.passenger_aisle [orders], phantom))
+
+	def draw (self, distribution, count):
+		return self.random.normal (distribution [0], distribution [1], count)
+
+	def run (self, time_step = 1):
+		#
+		# Returns the boarding time of each trial, in trial order.
+		#
+
+		trials = self.trial_count
+		passengers = self.passenger_count
+
+		self.occupant = numpy.zeros ((trials, self.no_cell + 1), int) - 1
+		self.occupant [:, self.no_cell] = passengers
+		self.location = numpy.zeros ((trials, passengers + 1), int) - 1
+		self.location [:, passengers] = -2
+		self.delay = numpy.zeros ((trials, passengers + 1))
+		self.phase = numpy.zeros ((trials, passengers + 1), int) + boarder.find_aisle
+		self.bags = self.random.randint (0, 3, (trials, passengers + 1))
+		self.borrowed = numpy.zeros ((trials, passengers + 1, 2), int) + self.no_cell
+		self.bin_load = numpy.zeros ((trials, self.bin_count + 1))
+		self.stuck = numpy.zeros ((trials, passengers + 1), bool)
+
+		finished = numpy.zeros ((trials, passengers + 1), bool)
+		finished [:, passengers] = True
+		unfinished = numpy.zeros (trials, int) + passengers
+		boarded = numpy.zeros (trials, int)
+		boarding_times = numpy.zeros (trials)
+		running = numpy.ones (trials, bool)
+		every_trial = numpy.arange (trials)
+
+		group = numpy.zeros (trials, int)
+		left_in_group = self.group_size [:, 0].copy ()
+
+		#
+		# For each door: how many of its passengers are on the plane, how many have
+		# got onto it (the same, except for stairs), when it can next take someone,
+		# and when each of its passengers reaches the top of the stairs.
+		#
+
+		door_count = len (self.door_cell)
+		entered = [numpy.zeros (trials, int) for d in range (door_count)]
+		admitted = [numpy.zeros (trials, int) for d in range (door_count)]
+		next_boarding = [numpy.zeros (trials) for d in range (door_count)]
+		arrival = [numpy.zeros (self.door_order [d].shape) for d in range (door_count)]
+
+		iteration = 0
+		self.ticks = 0
+		self.passenger_steps = 0
+
+		while running.any ():
+			iteration += 1
+			time = (iteration - 1) * time_step
+
+			t = numpy.nonzero (running & (left_in_group == 0) & (boarded < passengers)) [0]
+			group [t] += 1
+			left_in_group [t] = self.group_size [t, group [t]]
+
+			#
+			# Each door boards one passenger in each trial where it is clear and its
+			# boarding delay has passed, as door.board_next and stair_door.board_next do.
+			#
+
+			for d in range (door_count):
+				cell = self.door_cell [d]
+				order = self.door_order [d]
+
+				if self.door_capacity [d]:
+					k = entered [d]
+					t = numpy.nonzero (running & (k < admitted [d]) & (time > arrival [d][every_trial, k])) [0]
+				else:
+					k = admitted [d]
+					t = numpy.nonzero (running & (self.group [every_trial, order [every_trial, k]] == group) & \
+							(time > next_boarding [d])) [0]
+
+				t = t [self.occupant [t, cell] == -1]
+
+				if len (t):
+					j = order [t, k [t]]
+					self.occupant [t, cell] = j
+					self.location [t, j] = cell
+					entered [d][t] += 1
+					boarded [t] += 1
+					left_in_group [t] -= 1
+
+					if not self.door_capacity [d]:
+						admitted [d][t] += 1
+						next_boarding [d][t] = time + self.draw (self.boarding_delay, len (t))
+
+				if self.door_capacity [d]:
+					k = admitted [d]
+					t = numpy.nonzero (running & (self.group [every_trial, order [every_trial, k]] == group) & \
+							(k - entered [d] < self.door_capacity [d]) & (time > next_boarding [d])) [0]
+
+					if len (t):
+						arrival [d][t, k [t]] = time + self.draw (self.SS, len (t))
+						admitted [d][t] += 1
+						next_boarding [d][t] = time + self.draw (self.boarding_delay, len (t))
+
+			on_board = (self.location >= 0) & ~finished
+			numpy.subtract (self.delay, time_step, out = self.delay, where = on_board)
+			numpy.maximum (self.delay, 0, out = self.delay)
+
+			#
+			# The ready passengers come out by trial and then by boarding order; rank
+			# is each one's position within their trial.
+			#
+
+			ready = numpy.flatnonzero (on_board & (self.delay == 0))
+			t, j = self.without_queued_walkers (ready // (passengers + 1), ready % (passengers + 1))
+
+			if len (t):
+				rank = numpy.arange (len (t)) - numpy.searchsorted (t, t)
+				by_rank = numpy.argsort (rank, kind = 'mergesort')
+				round_sizes = numpy.bincount (rank)
+				sitting = []
+				start = 0
+
+				for size in round_sizes:
+					chosen = by_rank [start:start + size]
+					start += size
+
+					#
+					# Someone crossed earlier in this iteration has a new delay and
+					# doesn't get to act.
+					#
+
+					rt = t [chosen]
+					rj = j [chosen]
+					ready = self.delay [rt, rj] == 0
+					rt = rt [ready]
+					rj = rj [ready]
+
+					self.step (rt, rj)
+					self.passenger_steps += len (rt)
+
+					seated = (self.location [rt, rj] == self.target [rt, rj]) & (self.delay [rt, rj] == 0)
+					sitting += [(rt [seated], rj [seated])]
+
+				st = numpy.concatenate ([s [0] for s in sitting])
+				sj = numpy.concatenate ([s [1] for s in sitting])
+				sat = self.delay [st, sj] == 0
+				finished [st [sat], sj [sat]] = True
+				unfinished -= numpy.bincount (st [sat], minlength = trials)
+
+			self.ticks += running.sum ()
+			done = running & (unfinished == 0)
+			boarding_times [done] = iteration * time_step
+			running &= ~done
+
+		return boarding_times.tolist ()
+
+	def without_queued_walkers (self, t, j):
+		#
+		# Someone walking to their aisle or row who is queued behind a passenger with a
+		# delay (or behind someone else stuck in such a queue) can't move this iteration,
+		# since only a cell's occupant ever frees it. Stepping them would do nothing
+		# and draw no random numbers, so they are left out; this is most of the people
+		# on the plane at any time, and would otherwise each take a round.
+		#
+
+		here = self.location [t, j]
+		phase = self.phase [t, j]
+		file = self.cell_file [here]
+		aisle_goal = self.closest_aisle [t, j]
+		row = self.cell_row [here]
+		row_goal = self.target_row [t, j]
+		finding_aisle = phase == boarder.find_aisle
+
+		walking = numpy.where (finding_aisle, file != aisle_goal, (phase == boarder.find_row) & (row != row_goal))
+		direction = numpy.where (finding_aisle, numpy.where (file < aisle_goal, self.east, self.west), \
+				numpy.where (row < row_goal, self.south, self.north))
+		ahead = self.occupant [t, self.neighbours [here, direction]]
+		walking &= ahead >= 0
+
+		stuck = walking & (self.delay [t, ahead] > 0)
+
+		if stuck.any ():
+			while True:
+				self.stuck [t [stuck], j [stuck]] = True
+				behind_stuck = walking & ~stuck & self.stuck [t, ahead]
+
+				if not behind_stuck.any ():
+					break
+
+				stuck |= behind_stuck
+
+			self.stuck [t [stuck], j [stuck]] = False
+
+		return t [~stuck], j [~stuck]
+
+	def step (self, t, j):
+		#
+		# One step of boarder.step for passenger j of trial t, for each pair (t, j)
+		# in the arrays; each trial appears at most once.
+		#
+
+		occupant = self.occupant
+
+		cells = self.borrowed [t, j].ravel ()
+		bt = t.repeat (2)
+		own = occupant [bt, cells] == j.repeat (2)
+		occupant [bt [own], cells [own]] = -1
+		self.borrowed [t, j] = self.no_cell
+
+		here = self.location [t, j]
+		moving = here != self.target [t, j]
+		t = t [moving]
+		j = j [moving]
+		here = here [moving]
+
+		#
+		# Walk along row zero to the aisle nearest the seat, then down the aisle to the
+		# row. Reaching the aisle or the row moves straight on to the next phase.
+		#
+
+		phase = self.phase [t, j]
+		file = self.cell_file [here]
+		aisle_goal = self.closest_aisle [t, j]
+		row = self.cell_row [here]
+		row_goal = self.target_row [t, j]
+
+		phase [(phase == boarder.find_aisle) & (file == aisle_goal)] = boarder.find_row
+		phase [(phase == boarder.find_row) & (row == row_goal)] = boarder.find_seat
+		self.phase [t, j] = phase
+
+		walking = phase != boarder.find_seat
+		direction = numpy.where (phase == boarder.find_aisle, numpy.where (file < aisle_goal, self.east, self.west), \
+				numpy.where (row < row_goal, self.south, self.north))
+		self.move (t [walking], j [walking], here [walking], direction [walking], self.AA)
+
+		seating = ~walking
+
+		if seating.any ():
+			self.find_seat (t [seating], j [seating])
+
+	def move (self, t, j, here, direction, distribution):
+		#
+		# Moves into the next cell if it is available, as in the find_aisle and
+		# find_row phases.
+		#
+
+		there = self.neighbours [here, direction]
+		free = self.occupant [t, there] == -1
+		t, j, here, there = t [free], j [free], here [free], there [free]
+
+		self.delay [t, j] += self.draw (distribution, len (t))
+		self.occupant [t, here] = -1
+		self.occupant [t, there] = j
+		self.location [t, j] = there
+
+	def find_seat (self, t, j):
+		occupant = self.occupant
+		location = self.location
+		delay = self.delay
+		here = location [t, j]
+
+		#
+		# Stow any bags first. Each bag takes longer the fuller the bin is.
+		#
+
+		bin = self.cell_bin [here]
+		carrying = (self.bags [t, j] > 0) & (bin >= 0)
+
+		if carrying.any ():
+			bt, bj, bb = t [carrying], j [carrying], bin [carrying]
+			bags = self.bags [bt, bj]
+			stowing = numpy.zeros (len (bt))
+
+			for bag in range (bags.max ()):
+				m = bags > bag
+				self.bin_load [bt [m], bb [m]] += 1
+				stowing [m] += self.bin_load [bt [m], bb [m]] ** 0.5 * \
+						self.random.normal (self.bin_load_delay, self.bin_load_delay / 6.0, m.sum ())
+
+			delay [bt, bj] += stowing
+			self.bags [bt, bj] = 0
+
+		file = self.cell_file [here]
+		goal = self.target_file [t, j]
+		direction = numpy.where (file > goal, self.west, self.east)
+		next_cell = self.neighbours [here, direction]
+		m = (file != goal) & (next_cell != self.no_cell)
+		t, j, here, direction, next_cell = t [m], j [m], here [m], direction [m], next_cell [m]
+		aisle = self.cell_is_aisle [here]
+
+		#
+		# The simplest case: the next cell is available. The current one is borrowed
+		# until the next step.
+		#
+
+		m = occupant [t, next_cell] == -1
+
+		if m.any ():
+			ft, fj, fh, fn = t [m], j [m], here [m], next_cell [m]
+			delay [ft, fj] += numpy.where (aisle [m], self.draw (self.AS, len (ft)), self.draw (self.SS, len (ft)))
+			self.borrowed [ft, fj, 0] = fh
+			occupant [ft, fn] = fj
+			location [ft, fj] = fn
+
+		#
+		# Otherwise count the seated people in the way, as travel_until_empty does.
+		#
+
+		m = ~m
+
+		if not m.any ():
+			return
+
+		t, j, here, direction, next_cell, aisle = t [m], j [m], here [m], direction [m], next_cell [m], aisle [m]
+		target = self.target [t, j]
+
+		first = occupant [t, next_cell]
+		second_cell = self.neighbours [next_cell, direction]
+		second = occupant [t, second_cell]
+		third_cell = self.neighbours [second_cell, direction]
+		third = occupant [t, third_cell]
+
+		count = (location [t, first] == next_cell) * (1 + (location [t, second] == second_cell) * \
+				(1 + (location [t, third] == third_cell)))
+
+		#
+		# Crossing from the aisle: borrow the aisle cell behind us too if it is free.
+		#
+
+		m = aisle & (count > 0) & (count < 3)
+
+		if m.any ():
+			at, aj, ah, acount, afirst, asecond = t [m], j [m], here [m], count [m], first [m], second [m]
+			far = numpy.where (acount == 1, second_cell [m], target [m])
+			go = occupant [at, far] == -1
+			at, aj, ah, acount, afirst, asecond, far = \
+					at [go], aj [go], ah [go], acount [go], afirst [go], asecond [go], far [go]
+
+			n = len (at)
+			behind = self.neighbours [ah, self.south]
+			roomy = (behind != self.no_cell) & (occupant [at, behind] == -1)
+			mandatory = numpy.where (roomy, 0, self.draw (self.AA, n) + self.draw (self.AA, n))
+
+			one = numpy.maximum (self.draw (self.AA, n), self.draw (self.SS, n)) + self.draw (self.AS, n) + \
+					numpy.maximum (self.draw (self.SS, n), self.draw (self.AS, n))
+			two = numpy.maximum (numpy.maximum (self.draw (self.AA, n), self.draw (self.SA, n)), self.draw (self.SS, n)) + \
+					self.draw (self.SA, n) + self.draw (self.AS, n) + \
+					numpy.maximum (self.draw (self.SA, n), self.draw (self.SS, n)) + \
+					numpy.maximum (numpy.maximum (self.draw (self.SS, n), self.draw (self.SS, n)), self.draw (self.AS, n))
+			mandatory += numpy.where (acount == 1, one, two)
+
+			self.borrowed [at, aj, 0] = ah
+			self.borrowed [at [roomy], aj [roomy], 1] = behind [roomy]
+			occupant [at [roomy], behind [roomy]] = aj [roomy]
+
+			delay [at, aj] += mandatory
+			delay [at, afirst] += mandatory
+			crossing_two = acount == 2
+			delay [at [crossing_two], asecond [crossing_two]] += mandatory [crossing_two]
+
+			occupant [at, far] = aj
+			location [at, aj] = far
+
+		#
+		# Crossing mid-seat: step back into the cell we came from while the person in
+		# the way (who must be settled) moves past.
+		#
+
+		m = ~aisle & (count > 0)
+
+		if m.any ():
+			st, sj, sh, sd, sfirst, starget = t [m], j [m], here [m], direction [m], first [m], target [m]
+			behind = self.neighbours [sh, numpy.where (sd == self.west, self.east, self.west)]
+			go = (occupant [st, behind] == -1) & (occupant [st, starget] == -1) & (delay [st, sfirst] == 0)
+			st, sj, sh, sfirst, starget, behind = st [go], sj [go], sh [go], sfirst [go], starget [go], behind [go]
+
+			n = len (st)
+			mandatory = numpy.maximum (self.draw (self.SA, n), self.draw (self.SS, n)) + \
+					self.draw (self.SA, n) + self.draw (self.AS, n) + \
+					numpy.maximum (self.draw (self.SS, n), self.draw (self.AS, n))
+
+			occupant [st, behind] = sj
+			self.borrowed [st, sj, 0] = behind
+			self.borrowed [st, sj, 1] = sh
+			delay [st, sj] += mandatory + self.draw (self.SS, n)
+			delay [st, sfirst] += mandatory + self.draw (self.SS, n)
+			occupant [st, starget] = sj
+			location [st, sj] = starget
+
+#
+# Planes
+#
+
+class airbus_320 (single_entrance_manager, grid_plane_geometry):
+	name = "airbus-320"
+
+	def __init__ (self, number_of_bags_function, bin_load_delay_function, SS, AS, SA, AA):
+		grid_plane_geometry.__init__ (self, 23, (3, 3), \
+				lambda row: True, number_of_bags_function, SS, AS, SA, AA, 4, bin_load_delay_function, 2)
+
+		single_entrance_manager.__init__ (self, self.aisles [0].head)
+
+S1 = airbus_320
+
+class boeing_767_200 (single_entrance_manager, combined_plane_geometry):
+	name = "boeing-767-200"
+
+	def __init__ (self, number_of_bags_function, bin_load_delay_function, SS, AS, SA, AA):
+		combined_plane_geometry.__init__ (self, \
+				grid_plane_geometry (8, (2, 2, 2), \
+						lambda row: True, number_of_bags_function, SS, AS, SA, AA, 8, bin_load_delay_function, 3, routes = False), \
+				grid_plane_geometry (25, (2, 3, 2), \
+						lambda row: True, number_of_bags_function, SS, AS, SA, AA, 8, bin_load_delay_function, 3, routes = False))
+
+		single_entrance_manager.__init__ (self, self.aisles [0].head)
+
+S2 = boeing_767_200
+
+class boeing_767_400 (single_entrance_manager, combined_plane_geometry):
+	name = "boeing-767-400"
+
+	def __init__ (self, number_of_bags_function, bin_load_delay_function, SS, AS, SA, AA):
+		combined_plane_geometry.__init__ (self, \
+				grid_plane_geometry (8, (2, 2, 2), \
+						lambda row: True, number_of_bags_function, SS, AS, SA, AA, 8, bin_load_delay_function, 3, routes = False), \
+				grid_plane_geometry (25, (2, 3, 2), \
+						lambda row: True, number_of_bags_function, SS, AS, SA, AA, 8, bin_load_delay_function, 3, routes = False))
+
+		single_entrance_manager.__init__ (self, self.aisles [0].head)
+
+M1 = boeing_767_400
+
+class airbus_a300_600 (single_entrance_manager, grid_plane_geometry):
+	name = "airbus-a300-600"
+
+	def __init__ (self, number_of_bags_function, bin_load_delay_function, SS, AS, SA, AA):
+		grid_plane_geometry.__init__ (self, 50, (2, 4, 2), \
+				lambda row: True, number_of_bags_function, SS, AS, SA, AA, 4, bin_load_delay_function, 2)
+
+		single_entrance_manager.__init__ (self, self.aisles [0].head)
+
+M2 = airbus_a300_600
+
+class boeing_747 (single_entrance_manager, grid_plane_geometry):
+	name = "boeing-747"
+
+	def __init__ (self, number_of_bags_function, bin_load_delay_function, SS, AS, SA, AA):
+		grid_plane_geometry.__init__ (self, 40, (3, 4, 3), \
+				lambda row: True, number_of_bags_function, SS, AS, SA, AA, 4, bin_load_delay_function, 2)
+
+		single_entrance_manager.__init__ (self, self.aisles [0].head)
+
+L1 = boeing_747
+
+class airbus_380 (single_entrance_manager, two_floor_plane_geometry):
+	name = "airbus-380"
+
+	def __init__ (self, number_of_bags_function, bin_load_delay_function, SS, AS, SA, AA):
+		two_floor_plane_geometry.__init__ (self, \
+				grid_plane_geometry (40, (3, 4, 3), \
+					lambda row: True, number_of_bags_function, SS, AS, SA, AA, 4, bin_load_delay_function, 2), \
+				grid_plane_geometry (30, (2, 4, 2), \
+					lambda row: True, number_of_bags_function, SS, AS, SA, AA, 4, bin_load_delay_function, 2), \
+				None)
+
+	def board (self, passenger):
+		two_floor_plane_geometry.board (self, passenger)
+
+	def available (self):
+		return two_floor_plane_geometry.available (self)
+
+L2 = airbus_380
+
+all_planes = (S1, S2, M1, M2, L1, L2)
+
+#
+# Layouts
+#
+# A plane can also be described as data (a dict, or JSON; see read_layouts) rather
+# than written as a class:
+#
+#   {"name": "boeing-767-200",
+#    "decks": [{"sections": [{"rows": 8, "seat_groups": [2, 2, 2], "bins": {"capacity": 8, "row_span": 3}},
+#                            {"rows": 25, "seat_groups": [2, 3, 2], "bins": {"capacity": 8, "row_span": 3}}],
+#               "doors": [{"aisle": 0}]}]}
+#
+# A deck is one or two sections, front to back, each with the given number of rows
+# and groups of seat files; there is an aisle between each pair of groups, and the
+# aisles of a deck's sections join up, so they must have the same number. Each
+# section's luggage bins hold capacity bags and span row_span rows (4 and 2 if bins
+# are left out). A deck's doors are each at the front (the default) or the rear
+# ("end": "rear") of the given aisle; with none, there is one at the front of the
+# first. The deck's door_policy ("nearest", the default, or "first"; see the door
+# policies above) says which door each passenger uses. A rear door only serves its
+# own aisle, so a deck without a front door needs one at the rear of every aisle.
+# A plane has one deck, or two: the lower and then the upper. The upper deck has
+# one door, where the stairs from the lower deck come out; the stairs hold up to
+# "stairs": {"capacity": 4} passengers at once, each climbing for as long as a
+# seat move takes them.
+#
+
+class compiled_layout:
+	#
+	# What compile_layout returns. Like a plane class, it has a name and builds a
+	# plane when called with the plane's random parts, so it can go anywhere that a
+	# plane class can.
+	#
+	# The geometry is only built once: it is built without drawing any random
+	# numbers and pickled, and each plane is unpickled from that and then reset (see
+	# grid_plane_geometry.reset), which draws them in the same order as building
+	# would. With cache_directory set, the pickle is also kept there, named after a
+	# digest of the layout and this file, so later runs don't build it at all.
+	#
+
+	cache_directory = None
+	source_digest = None
+	partial_files = count ()
+
+	def __init__ (self, layout):
+		self.layout = layout
+		self.name = str (layout ['name'])
+		self.compiled = None
+
+	def __call__ (self, number_of_bags_function, bin_load_delay_function, SS, AS, SA, AA):
+		plane = unpickle (self.load ())
+		plane.reset (number_of_bags_function, bin_load_delay_function, SS, AS, SA, AA)
+		return plane
+
+	def digest (self):
+		if compiled_layout.source_digest == None:
+			compiled_layout.source_digest = md5 (file (__file__.endswith (".pyc") and __file__ [:-1] or __file__).read ()).hexdigest ()
+
+		return md5 (json_text (self.layout, sort_keys = True) + compiled_layout.source_digest).hexdigest ()
+
+	def load (self):
+		if self.compiled == None:
+			path = compiled_layout.cache_directory and join (compiled_layout.cache_directory, self.digest () + ".plane")
+
+			if path and exists (path):
+				self.compiled = file (path, 'rb').read ()
+			else:
+				self.compiled = pickle (self.build (), 2)
+
+				if path:
+					#
+					# Written under another name first, so that processes building the same
+					# layout at once never see half of a file. The name is this process's own
+					# (pool workers are forked from one parent, so they share everything else).
+					#
+
+					partial = "%s.%d.%d" % (path, getpid (), compiled_layout.partial_files.next ())
+					file (partial, 'wb').write (self.compiled)
+					rename (partial, path)
+
+		return self.compiled
+
+	def build (self):
+		decks = [self.build_deck (deck) for deck in self.layout ['decks']]
+
+		if len (decks) == 1:
+			plane = decks [0]
+		else:
+			plane = two_floor_plane_geometry (decks [0], decks [1], None, self.layout.get ('stairs', {}).get ('capacity', 4))
+
+		plane.name = self.name
+		return plane
+
+	def build_deck (self, deck):
+		sections = []
+
+		for section in deck ['sections']:
+			bins = section.get ('bins', {})
+			sections += [grid_plane_geometry (section ['rows'], tuple (section ['seat_groups']), lambda row: True, \
+					lambda: 0, None, None, None, None, bins.get ('capacity', 4), None, bins.get ('row_span', 2), \
+					routes = len (deck ['sections']) == 1)]
+
+		if len (sections) == 1:
+			geometry = sections [0]
+		else:
+			geometry = combined_plane_geometry (sections [0], sections [1])
+
+		#
+		# A front door opens onto the head of its aisle and a rear one onto the tail
+		# of its aisle in the last section.
+		#
+
+		doors = []
+
+		for door in deck.get ('doors', [{'aisle': 0}]):
+			if door.get ('end', 'front') == 'front':
+				doors += [geometry.aisles [door ['aisle']].head]
+			else:
+				doors += [sections [-1].aisles [door ['aisle']].tail]
+
+		geometry.start_location = doors [0]
+		fit_doors (geometry, doors, door_policies [deck.get ('door_policy', 'nearest')])
+		return geometry
+
+def compile_layout (layout):
+	#
+	# Checks a layout and returns its compiled_layout, or raises ValueError.
+	#
+
+	name = layout.get ('name')
+	decks = layout.get ('decks', [])
+
+	if not name:
+		raise ValueError ("a layout needs a name")
+
+	if len (decks) not in (1, 2):
+		raise ValueError ("%s: a layout has one deck or two" % name)
+
+	for deck in decks:
+		sections = deck.get ('sections', [])
+
+		if len (sections) not in (1, 2):
+			raise ValueError ("%s: a deck has one section or two" % name)
+
+		for section in sections:
+			if section.get ('rows', 0) < 1 or len (section.get ('seat_groups', [])) < 2 or min (section ['seat_groups']) < 1:
+				raise ValueError ("%s: a section needs rows and at least two groups of seats" % name)
+
+		if len (set ([len (section ['seat_groups']) for section in sections])) > 1:
+			raise ValueError ("%s: the sections of a deck need the same number of aisles" % name)
+
+		doors = deck.get ('doors', [{'aisle': 0}])
+		aisles = len (sections [0]['seat_groups']) - 1
+
+		if len (doors) < 1 or (deck is decks [-1] and len (decks) > 1 and len (doors) > 1):
+			raise ValueError ("%s: a deck needs a door, and the upper deck of a two-deck layout has only one" % name)
+
+		for door in doors:
+			if not 0 <= door.get ('aisle', -1) < aisles or door.get ('end', 'front') not in ('front', 'rear'):
+				raise ValueError ("%s: a door has to be at the front or the rear of one of the aisles" % name)
+
+		if len ([door for door in doors if door.get ('end', 'front') == 'front']) == 0 and \
+				len (set ([door ['aisle'] for door in doors])) < aisles:
+			raise ValueError ("%s: only a door at the front can reach every aisle" % name)
+
+		if deck.get ('door_policy', 'nearest') not in door_policies:
+			raise ValueError ("%s: the door policies are %s" % (name, ", ".join (sorted (door_policies))))
+
+	if layout.get ('stairs', {}).get ('capacity', 4) < 1:
+		raise ValueError ("%s: the stairs need room for at least one passenger" % name)
+
+	return compiled_layout (layout)
+
+def read_layouts (path):
+	#
+	# The compiled layouts in a JSON file holding one layout or a list of them.
+	#
+
+	layouts = read_json (file (path))
+
+	if isinstance (layouts, dict):
+		layouts = [layouts]
+
+	return [compile_layout (layout) for layout in layouts]
+
+#
+# Test code
+#
+
+#
+# Passenger queues
+#
+
+def planned_shuffle (strategy, unboarded_passengers, plan_function):
+	#
+	# Picks groups of unboarded_passengers one after another, each in a random order.
+	# This has the same distribution as shuffling everyone and then picking the
+	# groups out of the result, which the loaders used to do, but not the same
+	# orders. plan_function gives the groups, in boarding order, as lists of
+	# positions in unboarded_passengers (leaving out anyone who isn't to board yet).
+	#
+	# The groups depend only on who is in the list, and that is always whoever the
+	# strategy's earlier groups left, in the plane's order; so on a given plane, the
+	# strategy and the length of the list say which plan it is. Plans are kept in the
+	# plane's loader_plans (see build_routes), which every passenger can get to, so
+	# they last as long as the plane and no longer.
+	#
+
+	plans = unboarded_passengers [0].loader_plans
+	key = (strategy, len (unboarded_passengers))
+
+	if key not in plans:
+		plans [key] = plan_function (unboarded_passengers)
+
+	plan = plans [key]
+	result = []
+
+	for group in plan:
+		result += [unboarded_passengers [i] for i in shuffle (group)]
+
+	return result
+
+def blocks (unboarded_passengers, order):
+	#
+	# This isn't a queue function; rather, it just breaks the plane
+	# into roughly equal blocks (actually, the blocks are adaptively
+	# sized to be roughly equal for the number of passengers remaining).
+	# Blocks are numbered from the front, and order lists them in the order
+	# they board.
+	#
+
+	farthest_back_row = max ([p.target.row for p in unboarded_passengers])
+	zone = [p.target.row * len (order) / (farthest_back_row + 1) for p in unboarded_passengers]
+
+	return [[i for i in range (len (zone)) if zone [i] == block] for block in order]
+
+def random_loader (time, unboarded_passengers):
+	return shuffle (unboarded_passengers)
+random_loader.name = "pre_assigned_random"
+
+def sequential_loader (time, unboarded_passengers):
+	return unboarded_passengers
+sequential_loader.name = "sequential"
+
+def sequential_block_loader (time, unboarded_passengers):
+	return planned_shuffle ("sequential_block", unboarded_passengers, lambda ps: blocks (ps, (0, 1, 2, 3, 4)))
+sequential_block_loader.name = "sequential_block"
+
+def reverse_block_loader (time, unboarded_passengers):
+	return planned_shuffle ("reverse_block", unboarded_passengers, lambda ps: blocks (ps, (4, 3, 2, 1, 0)))
+reverse_block_loader.name = "reverse_block"
+
+def reverse_loader (time, unboarded_passengers):
+	unboarded_passengers.reverse ()
+	return unboarded_passengers
+reverse_loader.name = "reverse_sequential"
+
+def outside_in_plan (unboarded_passengers):
+	maximum_distance_to_aisle = max ([p.target.route.aisle_distance for p in unboarded_passengers])
+	return [[i for i in range (len (unboarded_passengers)) \
+			if unboarded_passengers [i].target.route.aisle_distance == maximum_distance_to_aisle]]
+
+def outside_in_loader (time, unboarded_passengers):
+	return planned_shuffle ("outside_in", unboarded_passengers, outside_in_plan)
+outside_in_loader.name = "outside_in"
+
+def reverse_pyramid_plan (unboarded_passengers):
+	maximum_distance_to_aisle = max ([p.target.route.aisle_distance for p in unboarded_passengers])
+	farthest_back_row = max ([p.target.row for p in unboarded_passengers])
+
+	return [[i for i in range (len (unboarded_passengers)) \
+			if (maximum_distance_to_aisle - unboarded_passengers [i].target.route.aisle_distance) * (farthest_back_row / 2) < \
+				unboarded_passengers [i].target.row]]
+
+def reverse_pyramid_loader (time, unboarded_passengers):
+	return planned_shuffle ("reverse_pyramid", unboarded_passengers, reverse_pyramid_plan)
+reverse_pyramid_loader.name = "reverse_pyramid"
+
+def rotating_block_loader (time, unboarded_passengers):
+	return planned_shuffle ("rotating_block", unboarded_passengers, lambda ps: blocks (ps, (0, 4, 1, 3, 2)))
+rotating_block_loader.name = "rotating_block"
+
+#
+# Variations on the queue functions
+#
+
+#
+# Adapters run the loader they wrap once and split its order into two groups.
+# They used to call it once for each group, which shuffled twice (and reversed
+# twice, for reverse_loader), so the groups came from two different orders. A
+# loader may return any iterable; the engines only ever go through it once.
+#
+
+def partition (passengers, predicate):
+	#
+	# Yields the passengers for whom predicate is true and then the rest, each in
+	# their original order. Only the second group is held on to, so stacked
+	# adapters go through the order once each without copying it.
+	#
+
+	rest = []
+
+	for p in passengers:
+		if predicate (p):
+			yield p
+		else:
+			rest.append (p)
+
+	for p in rest:
+		yield p
+
+def staggered_adapter (previous_method):
+	return lambda time, unboarded_passengers: partition (previous_method (time, unboarded_passengers), \
+			lambda p: p.target.row % 2 == p.target.major_file % 2)
+staggered_adapter.name = "staggered"
+
+def even_odd_adapter (previous_method):
+	return lambda time, unboarded_passengers: partition (previous_method (time, unboarded_passengers), \
+			lambda p: p.target.row % 2 == 0)
+even_odd_adapter.name = "even_odd"
+
+def identity_adapter (previous_method):
+	return lambda time, unboarded_passengers: previous_method (time, unboarded_passengers)
+identity_adapter.name = "original"
+
+#
+# Running routines
+#
+
+def plane_functions (r, SS, AS, SA, AA, bin_load_delay):
+	#
+	# The random parts of a plane, as keyword arguments for a plane constructor or
+	# for reset ().
+	#
+
+	return dict (	number_of_bags_function			= lambda: r.randint (0, 2), \
+					bin_load_delay_function			= lambda t, c: t**0.5 * r.gauss (bin_load_delay, bin_load_delay / 6.0), \
+					SS								= SS,
+					AS								= AS,
+					SA								= SA,
+					AA								= AA)
+
+def plane_generator (plane, r, SS, AS, SA, AA, bin_load_delay):
+	return plane (**plane_functions (r, SS, AS, SA, AA, bin_load_delay))
+
+plane_templates = {}
+
+def plane_from_template (plane, r, SS, AS, SA, AA, bin_load_delay):
+	#
+	# Like plane_generator, but each plane class is only built once per process;
+	# after that the same plane is reset for every trial. Only one simulation at a
+	# time can use a given template.
+	#
+
+	if plane not in plane_templates:
+		plane_templates [plane] = plane_generator (plane, r, SS, AS, SA, AA, bin_load_delay)
+	else:
+		plane_templates [plane].reset (**plane_functions (r, SS, AS, SA, AA, bin_load_delay))
+
+	return plane_templates [plane]
+
+def run_single_simulation (plane = S2, boarding_function = reverse_block_loader, adapter = staggered_adapter, \
+		time_step = 0.5, seed = None, tracing = True, pictures = False, recorder = None, jet_bridge = None, \
+		engine = simulation):
+	#
+	# A traced run prints what each passenger did once it has finished; with pictures,
+	# it also draws the plane at every step, as it used to. A trajectory_recorder
+	# given as recorder is used instead of printing the passengers' events. With
+	# jet_bridge settings (see fit_jet_bridges), passengers walk through a gate and
+	# jet bridge to get to the plane. Without a seed, one is drawn and reported, so
+	# that the run can be repeated. engine is simulation or event_driven_simulation;
+	# the second gives the same boarding time, but writes one wait for each time a
+	# passenger was held up rather than one for every step they spent held up.
+	#
+
+	if seed == None:
+		seed = fresh_seed ()
+
+	r = Random (seed)
+	randomness.shuffle_generator.seed (derive_seed (seed, "shuffle"))
+	events = begin_tracing (tracing, pictures, recorder)
+
+	debug (debugging.status, lambda: "Building aircraft model and passenger list...")
+	single_plane = plane_generator (plane, r, \
+			lambda: r.gauss (7.0, 2.0), \
+			lambda: r.gauss (3.0, 0.8), \
+			lambda: r.gauss (3.5, 0.4), \
+			lambda: r.gauss (2.0, 0.3), \
+			3.0)
+	fit_jet_bridges (single_plane, Random (derive_seed (seed, "jet bridge")), jet_bridge)
+
+	boarding_time = engine (single_plane, boarding_function = adapter (boarding_function)).run ( \
+				passenger_selector_function		= lambda passenger: True, \
+				boarding_delay_function			= lambda: r.gauss (7.0, 1.0), \
+				time_step						= time_step)
+
+	end_tracing (events)
+	debug (debugging.output, lambda: "Simulation: boarding took %s units of time (seed %d)." % (boarding_time, seed))
+
+def begin_tracing (tracing, pictures, recorder):
+	#
+	# Sets up the debugging levels for a traced run (see run_single_simulation), and
+	# returns the trace_buffer that end_tracing writes out, if there is one.
+	#
+
+	if tracing and pictures:
+		debugging.current_debug = debugging.very_verbose
+	elif tracing:
+		debugging.current_debug = debugging.not_looped
+	else:
+		debugging.current_debug = debugging.output
+
+	debugging.tracing = tracing and pictures
+	events = tracing and not recorder and trace_buffer () or None
+	debugging.trace = recorder or events
+	return events
+
+def end_tracing (events):
+	debugging.trace = None
+
+	if events:
+		events.write (stdout)
+
+	debug (debugging.status, lambda: "".join (["%-22s %10.1f\n" % (name, count) \
+			for name, count in zip (step_counters.names, step_counters.current)]))
+
+def run_engine_comparison (planes, boarding_functions = (sequential_loader, reverse_loader), seed = 0, time_step = 1):
+	#
+	# Runs each plane/loader pair through both engines from the same seed and checks
+	# that they agree. The shuffle is reseeded for each engine, so the loaders that
+	# use shuffle () can be compared too.
+	#
+
+	debugging.current_debug = debugging.status
+	debugging.tracing = False
+
+	for plane in planes:
+		for b in boarding_functions:
+			results = []
+
+			for engine in (simulation, event_driven_simulation):
+				r = Random (seed)
+				randomness.shuffle_generator.seed (derive_seed (seed, "shuffle"))
+				s = engine (plane_generator (plane, r, \
+						lambda: r.gauss (7.0, 2.0), \
+						lambda: r.gauss (3.0, 0.8), \
+						lambda: r.gauss (3.5, 0.4), \
+						lambda: r.gauss (2.0, 0.3), \
+						3.0), \
+					boarding_function = b)
+
+				started = wall_clock ()
+				boarding_time = s.run ( \
+						passenger_selector_function		= lambda passenger: True, \
+						boarding_delay_function			= lambda: r.gauss (7.0, 1.0), \
+						time_step						= time_step)
+				results += [(boarding_time, wall_clock () - started)]
+
+			debug (debugging.output, lambda: "%s_%s\t%s\t%s\t%.3fs\t%.3fs\t%s" % (plane.name, b.name, \
+					results [0][0], results [1][0], results [0][1], results [1][1], \
+					results [0][0] == results [1][0] and "same" or "DIFFERENT"))
+
+def batch_distributions (possibility):
+	#
+	# The (mean, standard deviation) of each delay in a batch, scaled by a sensitivity
+	# possibility. The bin load delay is only a mean; its deviation is a sixth of it.
+	#
+
+	adjustable_parameters = (7.0, 3.0, 3.5, 2.0, 2.0, 0.8, 0.4, 0.3, 2.0, 7.0)
+
+	return dict (	SS					= (adjustable_parameters [0] * possibility [0], adjustable_parameters [4] * possibility [0]), \
+					AS					= (adjustable_parameters [1] * possibility [1], adjustable_parameters [5] * possibility [1]), \
+					SA					= (adjustable_parameters [2] * possibility [2], adjustable_parameters [6] * possibility [2]), \
+					AA					= (adjustable_parameters [3] * possibility [3], adjustable_parameters [7] * possibility [3]), \
+					bin_load_delay		= adjustable_parameters [8] * possibility [4], \
+					boarding_delay		= (adjustable_parameters [9] * possibility [5], possibility [5]))
+
+def seeded_gauss_functions (key, distributions):
+	#
+	# Normal random number functions, one for each (purpose, (mean, standard
+	# deviation)) in distributions, each drawing from its own generator seeded from
+	# key and its purpose. A generator shared between purposes would hand out its
+	# numbers in whatever order the purposes happened to ask for them, which differs
+	# from one strategy to the next. Making a generator costs about as much as a
+	# dozen draws, so it is only made when the first number is drawn.
+	#
+
+	def gauss (purpose, distribution):
+		generator = []
+
+		def draw ():
+			if not generator:
+				generator.append (Random (derive_seed (*(key + (purpose,)))))
+
+			return generator [0].gauss (distribution [0], distribution [1])
+
+		return draw
+
+	return [gauss (purpose, distribution) for purpose, distribution in distributions]
+
+def use_common_random_numbers (plane, seed, d):
+	#
+	# Gives each passenger their own stream for each of SS, AS, SA and AA, and each
+	# luggage bin its own stream, seeded from the trial's seed and the passenger's or bin's
+	# position, and draws the bag counts in seat order. Trials with the same seed
+	# then have the same passengers whatever order they board in, which is what
+	# common random numbers are for: the difference between two strategies is less
+	# noisy than either of their boarding times. Returns the boarding delay
+	# function, which gives the nth person to board the same delay every time.
+	#
+
+	bags = Random (derive_seed (seed, "bags"))
+	passengers = list (plane.passengers)
+
+	for i in range (len (passengers)):
+		passengers [i].reset (bags.randint (0, 2), *seeded_gauss_functions ((seed, "passenger", i), \
+				[(purpose, d [purpose]) for purpose in ("SS", "AS", "SA", "AA")]))
+
+	for i in range (len (plane.luggage_bins)):
+		bin_gauss = seeded_gauss_functions ((seed, "bin", i), \
+				[("load", (d ['bin_load_delay'], d ['bin_load_delay'] / 6.0))]) [0]
+		plane.luggage_bins [i].reset (lambda t, c, bin_gauss = bin_gauss: t**0.5 * bin_gauss ())
+
+	return seeded_gauss_functions ((seed,), [("boarding", d ['boarding_delay'])]) [0]
+
+def run_batch_trial (plane, possibility, adapter, boarding_function, seed, time_step, engine = simulation, \
+		common_random_numbers = False, jet_bridge = None):
+	#
+	# One simulation of a batch. Everything random about it (the passengers, the
+	# delays and the boarding order) comes from the seed, so it doesn't matter
+	# which process runs it or in what order. With common_random_numbers the
+	# passengers' delays come from their own streams (see use_common_random_numbers).
+	# The jet bridges, if there are any (see fit_jet_bridges), draw from a stream
+	# of their own.
+	#
+
+	r = Random (seed)
+	randomness.shuffle_generator.seed (derive_seed (seed, "shuffle"))
+
+	d = batch_distributions (possibility)
+	gauss = lambda distribution: lambda: r.gauss (distribution [0], distribution [1])
+
+	trial_plane = plane_from_template (plane, r, gauss (d ['SS']), gauss (d ['AS']), gauss (d ['SA']), gauss (d ['AA']), \
+			d ['bin_load_delay'])
+	boarding_delay_function = gauss (d ['boarding_delay'])
+
+	if common_random_numbers:
+		boarding_delay_function = use_common_random_numbers (trial_plane, seed, d)
+
+	fit_jet_bridges (trial_plane, Random (derive_seed (seed, "jet bridge")), jet_bridge)
+
+	return engine ( \
+			plane = trial_plane, \
+			boarding_function = adapter (boarding_function)).run ( \
+				passenger_selector_function		= lambda passenger: True, \
+				boarding_delay_function			= boarding_delay_function, \
+				time_step						= time_step)
+
+def run_counted_batch_trial (*arguments, **keywords):
+	#
+	# run_batch_trial's boarding time, along with the trial's step_counters.
+	#
+
+	boarding_time = run_batch_trial (*arguments, **keywords)
+	return (boarding_time, step_counters.current)
+
+def run_vectorised_batch (plane, possibility, adapter, boarding_function, trial_count, seed, time_step):
+	#
+	# All trial_count trials of one batch configuration at once; returns the list of
+	# boarding times.
+	#
+
+	return vectorised_batch_simulation (plane, adapter (boarding_function), trial_count, seed, \
+			**batch_distributions (possibility)).run (time_step)
+
+def compare_vectorised (plane, boarding_function, trial_count, seed = 0, time_step = 1, engine = simulation):
+	#
+	# The vectorised engine draws its random numbers differently, so it can only be
+	# checked against a scalar one statistically. This runs trial_count trials of a
+	# plane/loader pair through each and compares the boarding times with Welch's
+	# t-test (for the means) and a two-sample Kolmogorov-Smirnov test (for the whole
+	# distribution), both at about the 1% level. Returns the scalar and vectorised
+	# boarding times, t, D, how long each engine took, and whether they are
+	# consistent.
+	#
+
+	mean = lambda xs: sum (xs) / float (len (xs))
+
+	def variance (xs):
+		m = mean (xs)
+		return sum ([(x - m)**2 for x in xs]) / (len (xs) - 1.0)
+
+	def kolmogorov_smirnov (xs, ys):
+		xs = sorted (xs)
+		ys = sorted (ys)
+		return max ([abs (bisect_left (xs, v) / float (len (xs)) - bisect_left (ys, v) / float (len (ys))) \
+				for v in xs + ys])
+
+	started = wall_clock ()
+	scalar = [run_batch_trial (plane, [1.0] * 6, identity_adapter, boarding_function, \
+			derive_seed (seed, plane.name, boarding_function.name, trial), time_step, engine) for trial in range (trial_count)]
+	scalar_duration = wall_clock () - started
+
+	started = wall_clock ()
+	vectorised = run_vectorised_batch (plane, [1.0] * 6, identity_adapter, boarding_function, trial_count, \
+			derive_seed (seed, plane.name, boarding_function.name), time_step)
+	vectorised_duration = wall_clock () - started
+
+	t = (mean (scalar) - mean (vectorised)) / ((variance (scalar) + variance (vectorised)) / trial_count)**0.5
+	d = kolmogorov_smirnov (scalar, vectorised)
+	consistent = abs (t) < 2.6 and d < 1.63 * (2.0 / trial_count)**0.5
+
+	return scalar, vectorised, t, d, scalar_duration, vectorised_duration, consistent
+
+def run_vectorised_comparison (planes, boarding_functions = (random_loader, reverse_block_loader), trial_count = 200, \
+		seed = 0, time_step = 1):
+	#
+	# compare_vectorised for each plane/loader pair, against the time-step engine.
+	#
+
+	debugging.current_debug = debugging.output
+	debugging.tracing = False
+
+	mean = lambda xs: sum (xs) / float (len (xs))
+	deviation = lambda xs: (sum ([(x - mean (xs))**2 for x in xs]) / (len (xs) - 1.0))**0.5
+
+	for plane in planes:
+		for b in boarding_functions:
+			scalar, vectorised, t, d, scalar_duration, vectorised_duration, consistent = \
+					compare_vectorised (plane, b, trial_count, seed, time_step)
+
+			debug (debugging.output, lambda: "%s_%s\t%.1f (%.1f)\t%.1f (%.1f)\tt = %.2f\tD = %.3f\t%.1fs\t%.1fs\t%s" % ( \
+					plane.name, b.name, mean (scalar), deviation (scalar), mean (vectorised), deviation (vectorised), \
+					t, d, scalar_duration, vectorised_duration, consistent and "consistent" or "INCONSISTENT"))
+
+#
+# Benchmarks
+#
+# These time the simulator rather than the boarding. Each plane/loader pair runs
+# a fixed set of seeded trials (the same seeds for every engine and every version
+# of the code), and the rates go into a JSON report. A report from an earlier run
+# can be given as a baseline, in which case each pair is compared against it.
+#
+
+benchmark_engines = {	"timestep"		: simulation, \
+						"event"			: event_driven_simulation, \
+						"vectorised"	: vectorised_batch_simulation}
+
+def run_benchmark_job (job):
+	#
+	# One plane/loader pair. Each of these runs in a fresh process, so that the peak
+	# memory is this pair's own and no plane is already built when the clock starts.
+	#
+
+	plane, boarding_function, engine_name, trial_count, seed, time_step = job
+	engine = benchmark_engines [engine_name]
+	engines = []
+
+	def counted (**arguments):
+		engines.append (engine (**arguments))
+		return engines [-1]
+
+	#
+	# An untimed trial first, so that the plane template is built outside of the
+	# timing; it uses a seed none of the timed trials do.
+	#
+
+	run_batch_trial (plane, [1.0] * 6, identity_adapter, boarding_function, derive_seed (seed, "warm-up"), time_step)
+
+	started = wall_clock ()
+
+	if engine == vectorised_batch_simulation:
+		s = vectorised_batch_simulation (plane, identity_adapter (boarding_function), trial_count, \
+				derive_seed (seed, plane.name, boarding_function.name), **batch_distributions ([1.0] * 6))
+		engines.append (s)
+		boarding_times = s.run (time_step)
+	else:
+		boarding_times = [run_batch_trial (plane, [1.0] * 6, identity_adapter, boarding_function, \
+				derive_seed (seed, plane.name, boarding_function.name, trial), time_step, counted) \
+				for trial in range (trial_count)]
+
+	elapsed = wall_clock () - started
+	ticks = sum ([int (s.ticks) for s in engines])
+	passenger_steps = sum ([int (s.passenger_steps) for s in engines])
+
+	return dict (	plane						= plane.name, \
+					loader						= boarding_function.name, \
+					trials						= trial_count, \
+					seconds						= elapsed, \
+					trials_per_second			= trial_count / elapsed, \
+					ticks						= ticks, \
+					ticks_per_second			= ticks / elapsed, \
+					passenger_steps				= passenger_steps, \
+					passenger_steps_per_second	= passenger_steps / elapsed, \
+					peak_memory_kb				= getrusage and getrusage (RUSAGE_SELF).ru_maxrss, \
+					mean_boarding_time			= sum (boarding_times) / float (trial_count), \
+					boarding_times_digest		= md5 (repr (boarding_times)).hexdigest ())
+
+def run_benchmark (planes, boarding_functions, engine_name = "timestep", trial_count = 5, seed = 0, time_step = 1, \
+		output = None, baseline = None, tolerance = 0.1):
+	#
+	# Writes the report to output (a path, or stdout if None) and returns the number
+	# of pairs whose trials per second fell by more than the tolerance (a fraction)
+	# compared with the baseline report.
+	#
+	# Ticks are iterations of the engine's time loop (summed over the trials) and
+	# passenger steps are calls to step () for one passenger, so the event-driven
+	# and vectorised engines do fewer of them for the same trials; trials per second
+	# is the rate to compare engines by. The peak memory is the resident set size
+	# given by getrusage (kilobytes on Linux), and is missing where that isn't
+	# available. The digest changes whenever any boarding time does.
+	#
+
+	debugging.current_debug = debugging.error
+	debugging.tracing = False
+
+	#
+	# Progress and the comparison go to stderr, so that they don't get mixed up with
+	# a report written to stdout.
+	#
+
+	jobs = [(plane, b, engine_name, trial_count, seed, time_step) for plane in planes for b in boarding_functions]
+	pool = Pool (1, maxtasksperchild = 1)
+	results = []
+
+	for result in pool.imap (run_benchmark_job, jobs):
+		stderr.write ("%s_%s\t%.2f trials/s\t%.0f ticks/s\t%.0f passenger steps/s\n" % (result ['plane'], \
+				result ['loader'], result ['trials_per_second'], result ['ticks_per_second'], result ['passenger_steps_per_second']))
+		results += [result]
+
+	pool.close ()
+	pool.join ()
+
+	report = dict (	engine			= engine_name, \
+					trials			= trial_count, \
+					seed			= seed, \
+					time_step		= time_step, \
+					python			= version.split () [0], \
+					numpy			= numpy and numpy.__version__, \
+					results			= results)
+
+	if output == None:
+		write_json (report, stdout, indent = 1, sort_keys = True)
+		stdout.write ("\n")
+	else:
+		f = open (output, "w")
+		write_json (report, f, indent = 1, sort_keys = True)
+		f.write ("\n")
+		f.close ()
+
+	if baseline == None:
+		return 0
+
+	f = open (baseline)
+	previous = read_json (f)
+	f.close ()
+
+	previous_results = dict ([((r ['plane'], r ['loader']), r) for r in previous ['results']])
+	regressions = 0
+
+	if (previous ['engine'], previous ['trials'], previous ['seed'], previous ['time_step']) != \
+			(engine_name, trial_count, seed, time_step):
+		stderr.write ("(the baseline ran %(trials)d trials of the %(engine)s engine from seed %(seed)d with time step %(time_step)s)\n" % \
+				previous)
+
+	for result in results:
+		key = (result ['plane'], result ['loader'])
+
+		if key not in previous_results:
+			stderr.write ("%s_%s\tnot in the baseline\n" % key)
+			continue
+
+		ratio = result ['trials_per_second'] / previous_results [key]['trials_per_second']
+
+		if ratio < 1 - tolerance:
+			verdict = "REGRESSION"
+			regressions += 1
+		elif ratio > 1 + tolerance:
+			verdict = "faster"
+		else:
+			verdict = "same"
+
+		if result ['boarding_times_digest'] != previous_results [key]['boarding_times_digest']:
+			verdict += " (different boarding times)"
+
+		stderr.write ("%s_%s\t%.2f -> %.2f trials/s\t%.2fx\t%s\n" % (key [0], key [1], \
+				previous_results [key]['trials_per_second'], result ['trials_per_second'], ratio, verdict))
+
+	return regressions
+
+#
+# Result sinks
+#
+# The batch runner hands each result to its sinks as it comes in. For each plane
+# and possibility it calls begin_configuration (name, plane, possibility, columns,
+# first_trial), where columns lists the (adapter, loader) pairs; then add_result for
+# each column of a trial (or skip_result, for a column that an adaptive batch has
+# stopped running), followed by end_trial; then end_configuration. close is called
+# once at the end. add_result is given the trial's step_counters, or None if the
+# vectorised engine ran it.
+#
+# When a sweep is resumed, resume (completed) is called first with the set of units
+# in the manifest that count as done, and first_trial is the first trial that
+# hasn't been done. Anything a sink wrote beyond that is to be thrown away.
+#
+
+class tsv_result_sink:
+	#
+	# The original output: a tab-separated file for each plane and possibility, named
+	# after them, with a column per adapter/loader pair and a row per trial.
+	#
+
+	def __init__ (self, directory = ""):
+		self.directory = directory
+
+	def resume (self, completed):
+		pass
+
+	def begin_configuration (self, name, plane, possibility, columns, first_trial):
+		#
+		# A resumed file keeps its header and its first first_trial rows.
+		#
+
+		path = join (self.directory, name)
+
+		if first_trial > 0:
+			rows = file (path).readlines () [:first_trial + 1]
+
+			if len (rows) < first_trial + 1 or not rows [-1].endswith ("\n"):
+				raise ValueError ("%s has fewer rows than the manifest records" % path)
+
+			self.file = file (path, 'w')
+			self.file.writelines (rows)
+		else:
+			self.file = file (path, 'w')
+
+			for a, b in columns:
+				self.file.write ("%s_%s\t" % (a.name, b.name))
 
+			self.file.write ("\n")
+
+	def add_result (self, plane, possibility, adapter, loader, trial, seed, boarding_time, counters):
+		self.file.write (str (boarding_time) + "\t")
+
+	def skip_result (self, plane, possibility, adapter, loader, trial):
+		self.file.write ("\t")
+
+	def end_trial (self):
+		self.file.write ("\n")
+		self.file.flush ()
+
+	def end_configuration (self):
+		self.file.close ()
+
+	def close (self):
+		pass
+
+class record_result_sink:
 	#
-	# These are keys used to index connections between nodes.
+	# Appends one fixed-width little-endian record per result to a single file, so
+	# that millions of them can be memory-mapped (see read_result_records) rather
+	# than parsed. The file starts with a text header, padded to header_size bytes,
+	# that gives the struct format of a record and the names of its fields. Names
+	# longer than their fields are truncated.
 	#
 
-	class directions:
-		north = "n"
-		south = "s"
-		east = "e"
-		west = "w"
-
-	def opposite (s):
-		if s == directions.north: return directions.south
-		if s == directions.south: return directions.north
-		if s == directions.east:  return directions.west
-		if s == directions.west:  return directions.east
-		return None
+	record_format = "<24s16s24s6dQId"
+	field_names = "plane adapter loader possibility seed trial boarding_time"
+	header_size = 256
+	header = ("mcm2007 results\n" + record_format + "\n" + field_names + "\n").ljust (header_size - 1) + "\n"
 
-	def ordinal (s):
+	def __init__ (self, path):
 		#
-		# Right and down are positive; other directions
-		# are negative.
+		# An existing file is appended to, as long as its records have the same layout.
 		#
 
-		if s == directions.north or s == directions.west: return -1
-		if s == directions.east or s == directions.south: return 1
-		return None
+		self.path = path
 
-	class debugging:
-		very_verbose = 5
-		quite_verbose = 4
-		moderately_verbose = 3
-		not_looped = 2
-		status = 1
-		output = 0
-		error = -1
-		
-		tracing = True
-		current_debug = very_verbose
+		if exists (path) and getsize (path) > 0:
+			existing = file (path, 'rb').read (record_result_sink.header_size)
+
+			if existing != record_result_sink.header:
+				raise ValueError ("%s is not a result file in this format" % path)
+
+			self.file = file (path, 'ab')
+		else:
+			self.file = file (path, 'wb')
+			self.file.write (record_result_sink.header)
 
-	def debug (level, message_function):
+	def resume (self, completed):
 		#
-		# I'm using a message function for optimization purposes. If we don't end up
-		# using this level of debugging, then there's no reason to compute the string
-		# required.
+		# Records are appended before the manifest is updated, so any that aren't in
+		# completed are at the end of the file (along with any partly written record).
 		#
 
-		if level <= debugging.current_debug:
-			if level >= debugging.error:
-				stdout.write (message_function () + "\n")
-			else:
-				stderr.write (message_function () + "\n")
+		self.file.flush ()
+		size = calcsize (record_result_sink.record_format)
+		count = max (0, (getsize (self.path) - record_result_sink.header_size) / size)
+		completed = set ([(plane [:24], possibility, adapter [:16], loader [:24], trial, seed) \
+				for plane, possibility, adapter, loader, trial, seed in completed])
+		existing = file (self.path, 'rb')
 
-	def shuffle (l):
-		r = Random ()
-		new_list = [[r.randint (0, len (l)), x] for x in l]
-		new_list.sort ()
-		return [y[1] for y in new_list]
+		while count > 0:
+			existing.seek (record_result_sink.header_size + (count - 1) * size)
+			r = unpack_from (record_result_sink.record_format, existing.read (size))
 
-	class node:
-		#
-		# Note that these row and file are mainly for reference
-		# purposes so that we can have each node print out its
-		# contents in a meaningful way.
-		#
+			if (r [0].rstrip ("\0"), r [3:9], r [1].rstrip ("\0"), r [2].rstrip ("\0"), r [10], r [9]) in completed:
+				break
 
-		#
-		# Arranged like this:
-		#
-		# SSSS A SSS A SSSS
-		#      A     A
-		# SSSS A SSS A SSSS
-		#      ...
-		# where vertical is row and horizontal is file.
-		#
+			count -= 1
 
-		def __init__ (self, row, file, nearest_luggage_bin):
-			self.current_occupant = None
-			self.row = row
-			self.file = file
-			self.nearest_luggage_bin = nearest_luggage_bin
-			self.connectors = {directions.north: None, directions.south: None, directions.east: None, directions.west: None}
+		existing.close ()
+		self.file.truncate (record_result_sink.header_size + count * size)
 
-		def __str__ (self):
-			if self.nearest_luggage_bin:
-				return " B(%3d, %3d)B " % (self.row, self.file)
-			else:
-				return "  (%3d, %3d)  " % (self.row, self.file)
+	def begin_configuration (self, name, plane, possibility, columns, first_trial):
+		pass
 
-		def available (self):
-			return self.current_occupant == None
+	def add_result (self, plane, possibility, adapter, loader, trial, seed, boarding_time, counters):
+		self.file.write (pack (record_result_sink.record_format, *([plane.name, adapter.name, loader.name] + \
+				list (possibility) + [seed, trial, boarding_time])))
 
-		def enter (self, someone):
-			self.current_occupant = someone
-			someone.location = self
-			return self
+	def skip_result (self, plane, possibility, adapter, loader, trial):
+		pass
 
-		def leave (self, someone):
-			self.current_occupant = None
-			return self
+	def end_trial (self):
+		self.file.flush ()
 
-		def connect (self, direction, destination):
-			#
-			# Connects this to another node (and vice versa) and returns the destination.
-			#
+	def end_configuration (self):
+		pass
 
-			self.connectors [direction] = destination
-			destination.connectors [opposite(direction)] = self
-			return destination
+	def close (self):
+		self.file.close ()
 
-		def is_seat (self):
-			return not (self.connectors [directions.north] or self.connectors [directions.south])
+class summary_result_sink:
+	#
+	# Summarises each column of each configuration as its results come in, without
+	# keeping them, and appends a row per column to a tab-separated summary file at
+	# the end of the configuration: the count, mean, standard deviation, extremes
+	# and P-squared estimates of a few quantiles (see p_square_quantile). Only the
+	# configuration being run is held in memory.
+	#
+	# A summary only covers the results it was given, so a resumed sweep can't add
+	# to one.
+	#
 
-		def is_aisle (self):
-			return self.connectors [directions.north] or self.connectors [directions.south]
+	quantiles = (0.05, 0.25, 0.5, 0.75, 0.95)
 
-		def shoot_off (self, direction):
-			n = self
+	def __init__ (self, path):
+		self.file = file (path, 'w')
+		self.file.write ("configuration\tcolumn\tcount\tmean\tstandard_deviation\tminimum\t" + \
+				"\t".join (["p%g" % (100 * q) for q in summary_result_sink.quantiles]) + "\tmaximum\n")
 
-			while n.connectors [direction]:
-				n = n.connectors [direction]
+	def resume (self, completed):
+		if len (completed):
+			raise ValueError ("a summary can't be added to by a resumed sweep")
 
-			return n
+	def begin_configuration (self, name, plane, possibility, columns, first_trial):
+		self.name = name
+		self.columns = columns
+		self.statistics = dict ([(column, running_statistics ()) for column in columns])
+		self.quantiles = dict ([(column, [p_square_quantile (q) for q in summary_result_sink.quantiles]) for column in columns])
+		self.extremes = {}
 
-		def travel (self, direction, distance):
-			n = self
+	def add_result (self, plane, possibility, adapter, loader, trial, seed, boarding_time, counters):
+		column = (adapter, loader)
+		self.statistics [column].add (boarding_time)
 
-			for i in range (distance):
-				n = n.connectors [direction]
+		for q in self.quantiles [column]:
+			q.add (boarding_time)
 
-			return n
+		low, high = self.extremes.get (column, (boarding_time, boarding_time))
+		self.extremes [column] = (min (low, boarding_time), max (high, boarding_time))
 
-		def travel_until_empty (self, direction):
-			n = self
-			count = 0
+	def skip_result (self, plane, possibility, adapter, loader, trial):
+		pass
 
-			#
-			# This function stops on borrowed nodes.
-			#
+	def end_trial (self):
+		pass
 
-			while n.connectors [direction] and n.connectors [direction].current_occupant and \
-					n.connectors [direction].current_occupant.location == n.connectors [direction]:
-				n = n.connectors [direction]
-				count += 1
+	def end_configuration (self):
+		for column in self.columns:
+			s = self.statistics [column]
 
-			return (count, n)
+			if s.count == 0:
+				continue
 
-		def nearest_aisle (self):
-			#
-			# Returns a 2-tuple with (distance, aisle_cell).
-			#
+			self.file.write ("%s\t%s_%s\t%d\t%.2f\t%.2f\t%s\t%s\t%s\n" % (self.name, column [0].name, column [1].name, \
+					s.count, s.mean, s.count > 1 and s.variance ()**0.5 or 0.0, self.extremes [column][0], \
+					"\t".join (["%.1f" % q.value () for q in self.quantiles [column]]), self.extremes [column][1]))
 
-			if self.is_aisle ():
-				return (0, self)
-			else:
-				west_offshoot = self
-				west_counter = 0
-				east_offshoot = self
-				east_counter = 0
+		self.file.flush ()
 
-				while west_offshoot.connectors [directions.west] and not west_offshoot.connectors [directions.west].is_aisle ():
-					west_offshoot = west_offshoot.connectors [directions.west]
-					west_counter += 1
+	def close (self):
+		self.file.close ()
 
-				while east_offshoot.connectors [directions.east] and not east_offshoot.connectors [directions.east].is_aisle ():
-					east_offshoot = east_offshoot.connectors [directions.east]
-					east_counter += 1
+class counter_result_sink:
+	#
+	# Writes the seed and step_counters of each result to a tab-separated file, a
+	# row per column of each trial, and at the end of each configuration a row per
+	# column with their means over its trials (with "mean" for the trial and no
+	# seed). Results from the vectorised engine have no counters and are left out.
+	#
 
-				if not west_offshoot.connectors [directions.west]:
-					return (east_counter, east_offshoot)
+	def __init__ (self, path):
+		self.file = file (path, 'w')
+		self.file.write ("configuration\tcolumn\ttrial\tseed\tboarding_time\t" + "\t".join (step_counters.names) + "\n")
 
-				if not east_offshoot.connectors [directions.east]:
-					return (west_counter, west_offshoot)
+	def resume (self, completed):
+		if len (completed):
+			raise ValueError ("counters can't be added to by a resumed sweep")
 
-				if east_counter < west_counter:
-					return (east_counter, east_offshoot)
-				else:
-					return (west_counter, west_offshoot)
+	def begin_configuration (self, name, plane, possibility, columns, first_trial):
+		self.name = name
+		self.columns = columns
+		self.totals = dict ([(column, [0] * (len (step_counters.names) + 1)) for column in columns])
+		self.counts = dict ([(column, 0) for column in columns])
 
-		def trail (self, direction):
-			n = self
-			t = [n]
+	def add_result (self, plane, possibility, adapter, loader, trial, seed, boarding_time, counters):
+		if counters == None:
+			return
 
-			while n.connectors [direction]:
-				n = n.connectors [direction]
-				t += [n]
+		column = (adapter, loader)
+		values = [boarding_time] + counters
+		self.totals [column] = [total + value for total, value in zip (self.totals [column], values)]
+		self.counts [column] += 1
+		self.file.write ("%s\t%s_%s\t%d\t%d\t%s\n" % (self.name, adapter.name, loader.name, trial, seed, \
+				"\t".join (["%g" % value for value in values])))
 
-			return t
+	def skip_result (self, plane, possibility, adapter, loader, trial):
+		pass
 
-		def compact_representation (self):
-			if self.current_occupant:
-				if self.current_occupant.location != self:
-					#
-					# The occupant is borrowing a cell.
-					#
+	def end_trial (self):
+		pass
 
-					return " -%03d-%01d- " % (self.current_occupant.personal_delay_counter, self.current_occupant.number_of_bags)
-				else:
-					if self.is_aisle ():
-						return " #%03d-%01d# " % (self.current_occupant.personal_delay_counter, self.current_occupant.number_of_bags)
-					else:
-						return " ++%03d++ " % (self.current_occupant.needed_to_wait)
-			else:
-				if self.is_aisle ():
-					return "    |    "
-				else:
-					return "    -    "
+	def end_configuration (self):
+		for column in self.columns:
+			if self.counts [column] == 0:
+				continue
 
-	class boarder:
-		pre_boarding = None
+			self.file.write ("%s\t%s_%s\tmean\t\t%s\n" % (self.name, column [0].name, column [1].name, \
+					"\t".join (["%.2f" % (total / float (self.counts [column])) for total in self.totals [column]])))
 
-		find_aisle = 0
-		find_row = 1
-		find_seat = 2
+		self.file.flush ()
 
-		#
-		# I'm using self.location to determine whether or not the boarder is on the plane.
-		# If they are not, then the location is None, whereas if they are, it will be set
-		# to someplace where they can find their way to their seats.
-		#
-		
-		def __init__ (self, location, target, number_of_bags, aisles_on_plane, SS, AS, SA, AA):
-			self.target = target
-			self.number_of_bags = number_of_bags
-			self.personal_delay_counter = 0
-			self.aisles_on_plane = aisles_on_plane
-			self.location = boarder.pre_boarding
-			self.seek_phase = boarder.find_aisle
-			self.closest_aisle = None
-			self.SS = SS
-			self.SA = SA
-			self.AS = AS
-			self.AA = AA
-			self.sequence_identifier = 0
-			self.needed_to_wait = 0
-			self.borrowed_cells = []
+	def close (self):
+		self.file.close ()
 
-			#
-			# Create a back-reference to the passenger.
-			#
+def read_manifest (path):
+	#
+	# The units recorded in a batch manifest, as (plane, possibility, adapter, loader,
+	# trial, seed) tuples. A line cut short by an interruption is ignored.
+	#
 
-			target.passenger = self
-		
-		def __str__ (self):
-			return "#%4d: %s --> %s; delay %4d; carrying %2d bags" % \
-				(self.sequence_identifier, str (self.location), str (self.target), self.personal_delay_counter, self.number_of_bags)
+	recorded = set ()
 
-		def number_of_bags_factor (self):
-			return self.number_of_bags_factor_function (self.number_of_bags)
+	if exists (path):
+		for line in file (path):
+			fields = line.split ("\t")
 
-		def finished (self):
-			return self.location == self.target and self.personal_delay_counter == 0
+			if line.endswith ("\n") and len (fields) == 6:
+				recorded.add ((fields [0], tuple ([float (x) for x in fields [1].split (",")]), \
+						fields [2], fields [3], int (fields [4]), int (fields [5])))
 
-		def step (self):
-			if self.personal_delay_counter == 0:
-				for cell in self.borrowed_cells:
-					if cell.current_occupant == self:
-						cell.current_occupant = None
-					else:
-						debug (debugging.error, lambda: "%s: Inconsistency in cell ownership of %s" % (str (self.location), str (cell)))
+	return recorded
 
-				self.borrowed_cells = []
+def append_to_manifest (path):
+	#
+	# Opens a batch manifest for appending. A line cut short by an interruption is
+	# cut off first, so that the next unit recorded starts a line of its own.
+	#
 
-				if self.location != self.target and self.location:
-					if self.seek_phase == boarder.find_aisle:
-						#
-						# We find the aisle closest to our seat.
-						#
+	if exists (path):
+		f = file (path, 'r+b')
+		f.truncate (f.read ().rfind ("\n") + 1)
+		f.close ()
 
-						if not self.closest_aisle:
-							self.closest_aisle = min ([[abs (a.file - self.target.file), a.file] for a in self.aisles_on_plane]) [1]
+	return file (path, 'a')
 
-						#
-						# Now, navigate towards that aisle.
-						#
+def read_result_records (path):
+	#
+	# The records of a record_result_sink file, as a read-only numpy.memmap with one
+	# named field per column, or as a list of flat tuples (the possibility taking six
+	# places) if NumPy isn't available.
+	#
 
-						if self.location.file < self.closest_aisle:
-							self.next_direction = directions.east
-						elif self.location.file > self.closest_aisle:
-							self.next_direction = directions.west
-						else:
-							self.seek_phase = boarder.find_row
-							self.next_direction = None
+	if numpy != None:
+		return numpy.memmap (path, numpy.dtype ([	('plane',			'S24'), \
+													('adapter',			'S16'), \
+													('loader',			'S24'), \
+													('possibility',		'<f8', (6,)), \
+													('seed',			'<u8'), \
+													('trial',			'<u4'), \
+													('boarding_time',	'<f8')]), \
+				'r', record_result_sink.header_size)
+	else:
+		data = file (path, 'rb').read () [record_result_sink.header_size:]
+		size = calcsize (record_result_sink.record_format)
+		records = [unpack_from (record_result_sink.record_format, data, i) for i in range (0, len (data), size)]
+		return [tuple ([name.rstrip ("\0") for name in r [:3]]) + r [3:] for r in records]
+
+def read_trajectories (path):
+	#
+	# The runs in a trajectory_recorder file, as (plane name, time step, passenger
+	# count, cell count, last tick, boarding time, events) tuples, where each event is
+	# a (tick, passenger, cell, delay, bags, waits, borrowed cells) tuple. A run cut
+	# short by an interruption has a boarding time of None.
+	#
 
-						if self.next_direction:
-							if self.location.connectors [self.next_direction].available ():
-								self.personal_delay_counter += self.AA ()
-								self.location.leave (self).connectors [self.next_direction].enter (self)
-							else:
-								self.needed_to_wait += 1
+	data = file (path, 'rb').read ()
 
-						#
-						# We're going to go ahead and fall through to the next if statement.
-						#
+	if data [:trajectory_recorder.header_size] != trajectory_recorder.header:
+		raise ValueError ("%s is not a trajectory file in this format" % path)
 
-					if self.seek_phase == boarder.find_row:
-						#
-						# Now, we embark upon the simple task of locating our row.
-						#
+	run_size = calcsize (trajectory_recorder.run_format)
+	event_size = calcsize (trajectory_recorder.event_format)
+	runs = []
+	i = trajectory_recorder.header_size
 
-						if self.location.row < self.target.row:
-							self.next_direction = directions.south
-						elif self.location.row > self.target.row:
-							self.next_direction = directions.north
-						else:
-							self.seek_phase = boarder.find_seat
-							self.next_direction = None
-						
-						if self.next_direction:
-							if self.location.connectors [self.next_direction]:
-								if self.location.connectors [self.next_direction].available ():
-									self.location.leave (self).connectors [self.next_direction].enter (self)
-									self.personal_delay_counter += self.AA ()
-								else:
-									self.needed_to_wait += 1
-									#debug (debugging.very_verbose, lambda: " > Waiting")
-							else:
-								debug (debugging.error, lambda: " > %s is trying to go along nonexistent path %s" % (str (self), self.next_direction))
-
-					if self.seek_phase == boarder.find_seat:
-						#
-						# Finally, we find the seat in question.
-						# First, we make sure that we don't have any bags.
-						#
-
-						if self.number_of_bags > 0 and self.location.nearest_luggage_bin:
-							self.personal_delay_counter += self.location.nearest_luggage_bin.load_delay (self.number_of_bags)
-							self.number_of_bags = 0
-
-						if self.location.file > self.target.file:
-							self.next_direction = directions.west
-						elif self.location.file < self.target.file:
-							self.next_direction = directions.east
-						else:
-							debug (debugging.quite_verbose, lambda: "Found my seat!")
-							self.next_direction = None
+	while i + run_size <= len (data):
+		name, time_step, passenger_count, cell_count = unpack_from (trajectory_recorder.run_format, data, i)
+		i += run_size
+		tick = 0
+		boarding_time = None
+		events = []
 
-						if self.next_direction and self.location != self.target and self.location.connectors [self.next_direction]:
-							if self.location.connectors [self.next_direction].available ():
-								#
-								# This is the simplest case. The cell that we want to move into is available.
-								#
+		while i + event_size <= len (data):
+			ticks, passenger, cell, delay, bags, waits, borrowed_count = unpack_from (trajectory_recorder.event_format, data, i)
+			i += event_size
+			tick += ticks
 
-								if self.location.is_aisle ():
-									self.personal_delay_counter += self.AS ()
-								else:
-									self.personal_delay_counter += self.SS ()
-								
-								self.borrowed_cells += [self.location]
-								self.location.connectors [self.next_direction].enter (self)
-							else:
-								#
-								# We need to figure out how many people we have to cross.
-								#
+			if passenger == trajectory_recorder.end_of_run:
+				boarding_time = delay
+				break
 
-								number_of_people_to_cross = self.location.travel_until_empty (self.next_direction) [0]
-								
-								if number_of_people_to_cross == 0:
-									#
-									# The adjacent cell is borrowed, so we must wait for it to clear.
-									#
+			if i + 2 * borrowed_count > len (data):
+				break
 
-									self.needed_to_wait += 1
-								else:
-									#
-									# If we can borrow a spot in the aisle, then do that.
-									# To pull off the borrowing part, we'll be in both places simultaneously. :)
-									#
+			events += [(tick, passenger, cell, delay, bags, waits, unpack_from ("<%dH" % borrowed_count, data, i))]
+			i += 2 * borrowed_count
 
-									next_cell = self.location.connectors [self.next_direction]
-									
-									if self.location.is_aisle ():
-										#
-										# Try to claim adjacency for the aisle so that we can get more space
-										# and avoid shuffling (not explcitly simulated).
-										#
-										
-										south_aisle_cell = self.location.connectors [directions.south]
-										if south_aisle_cell and south_aisle_cell.available ():
-											#
-											# We have more space to work with, so we can save some time.
-											#
+		runs += [(name.rstrip ("\0"), time_step, passenger_count, cell_count, tick, boarding_time, events)]
 
-											mandatory_delay = 0
-										else:
-											#
-											# Simulate some aisle-shuffling that would take extra time.
-											#
+	return runs
 
-											mandatory_delay = self.AA () + self.AA ()
+def trajectory_frame (plane, time_step, events, tick):
+	#
+	# Puts the passengers of a newly built plane where a run's events say they were
+	# at the end of tick, and returns the plane's compact_representation (), which is
+	# what a traced run draws at the start of the next tick.
+	#
 
-										if number_of_people_to_cross == 1:
-											#
-											# The cell may be borrowed. This is possible because travel_until_empty stops
-											# when it hits a borrowed or empty cell.
-											#
+	latest = {}
 
-											if next_cell.connectors [self.next_direction].available ():
-												self.borrowed_cells += [self.location]
+	for event in events:
+		if event [0] > tick:
+			break
 
-												if south_aisle_cell and south_aisle_cell.available ():
-													self.borrowed_cells += [south_aisle_cell]
-													south_aisle_cell.current_occupant = self
+		latest [event [1]] = event
 
-												mandatory_delay += max (self.AA (), self.SS ()) + self.AS () + max (self.SS (), self.AS ())
-												self.personal_delay_counter += mandatory_delay
-												next_cell.current_occupant.personal_delay_counter += mandatory_delay
-												next_cell.connectors [self.next_direction].enter (self)
-											else:
-												self.needed_to_wait += 1
+	for cell in plane.cells:
+		cell.current_occupant = None
 
-										elif number_of_people_to_cross == 2:
-											#
-											# If we have to cross two people, then we are going after our target because
-											# no seat is farther than three away from the aisle.
-											#
+	for p in plane.passengers:
+		p.location = boarder.pre_boarding
 
-											if self.target.available ():
-												self.borrowed_cells += [self.location]
-												
-												if south_aisle_cell and south_aisle_cell.available ():
-													self.borrowed_cells += [south_aisle_cell]
-													south_aisle_cell.current_occupant = self
-
-												mandatory_delay += max (self.AA (), self.SA (), self.SS ()) + \
-														self.SA () + self.AS () + max (self.SA (), self.SS ()) + \
-														max (self.SS (), self.SS (), self.AS ())
-												self.personal_delay_counter += mandatory_delay
-												next_cell.current_occupant.personal_delay_counter += mandatory_delay
-												next_cell.connectors [self.next_direction].current_occupant.personal_delay_counter += mandatory_delay
-												self.target.enter (self)
-											else:
-												self.needed_to_wait += 1
-										else:
-											debug (debugging.error, lambda: "%s: Too many people to handle crossing process" % str (self.location))
+	for event_tick, passenger, cell, delay, bags, waits, borrowed in latest.itervalues ():
+		p = plane.passengers [passenger]
+		p.personal_delay_counter = max (0, delay - (tick - event_tick) * time_step)
+		p.number_of_bags = bags
+		p.needed_to_wait = waits
+		plane.cells [cell].enter (p)
 
-									else:
-										#
-										# Use the simple function for the number of spots to cross mid-seat.
-										# First, though, we need the aisle to be available so that we can swap.
-										#
-									
-										aisle_cell = self.location.connectors [opposite (self.next_direction)]
-									
-										if aisle_cell.available () and self.target.available () and \
-												next_cell.current_occupant.personal_delay_counter == 0:
-											aisle_cell.current_occupant = self
-											self.borrowed_cells += [aisle_cell, self.location]
-											mandatory_delay = max (self.SA (), self.SS ()) + self.SA () + self.AS () + max (self.SS (), self.AS ())
-											self.personal_delay_counter += mandatory_delay + self.SS ()
-											next_cell.current_occupant.personal_delay_counter += mandatory_delay + self.SS ()
-											self.target.enter (self)
-										else:
-											self.needed_to_wait += 1
-				
-	class luggage_bin:
-		def __init__ (self, bag_capacity, load_delay_function):
-			self.bag_capacity = bag_capacity
-			self.current_load = 0
-			self.delay = load_delay_function
-
-		def load_one_bag (self):
-			self.current_load += 1
-			return self.delay (self.current_load, self.bag_capacity)
-
-		def load_delay (self, additional_load):
-			return sum ([self.load_one_bag () for i in range (additional_load)])
-			
-	class aisle:
-		#
-		# An aisle is just the collection of nodes that makes up the
-		# aisle portion of an aircraft. It does not include any seats.
-		# Seats are added by using add_window_row and add_bridge_row.
-		#
-		
-		def __init__ (self, rows, file, bin_capacity, bin_load_delay_function, bin_row_span):
-			last_bin = luggage_bin (bin_capacity, bin_load_delay_function)
-			self.head = node (0, file, last_bin)
-			self.file = file
-			self.nodes = self.head,
-			self.rows = rows
-			p = self.head
-			last_bin_row = 1
-			
-			#
-			# The rows will go from 0 to rows - 1, inclusive.
-			# I'm using 1..rows because this translates to 1..rows - 1, and we
-			# added the zero row above.
-			#
+		for c in borrowed:
+			plane.cells [c].current_occupant = p
 
-			for i in range (1, rows):
-				if i > last_bin_row + bin_row_span - 1:
-					last_bin = luggage_bin (bin_capacity, bin_load_delay_function)
-					last_bin_row = i
+	return plane.compact_representation ()
 
-				n = node (i, file, last_bin)
-				p.connect (directions.south, n)
-				self.nodes += n,
-				p = n
+def replay_trajectories (path, run_number = None, ticks = None, stream = stdout, planes = all_planes):
+	#
+	# Lists the runs in a trajectory file, or draws the given ticks of one of them
+	# (its last tick by default) in the same form as a traced run's pictures. The
+	# run's plane is looked up by name in planes.
+	#
 
-			self.tail = n
+	runs = read_trajectories (path)
 
-		def add_window_row (self, row, direction, files, major_file):
-			#
-			# Returns the window seat.
-			#
-			
-			base = self.nodes [row]
-			
-			for i in range (files):
-				base = base.connect (direction, node (row, self.file + (i+1) * ordinal (direction), None))
-				base.major_file = major_file
+	if run_number == None:
+		for i, (name, time_step, passenger_count, cell_count, last_tick, boarding_time, events) in enumerate (runs):
+			stream.write ("%d\t%s\ttime step %g\t%d ticks\t%d events\tboarding took %s\n" % \
+					(i, name, time_step, last_tick, len (events), boarding_time))
 
-			return base
+		return
 
-		def add_bridge_row (self, bridged_aisle, row, direction, files, major_file):
-			#
-			# Returns the seat in the bridged aisle to which this aisle connects.
-			#
+	name, time_step, passenger_count, cell_count, last_tick, boarding_time, events = runs [run_number]
+	nothing = lambda: 0
+	plane = plane_generator (dict ([(p.name, p) for p in planes]) [name], Random (0), \
+			nothing, nothing, nothing, nothing, 0)
 
-			return self.add_window_row (row, direction, files, major_file).connect ( \
-					direction, bridged_aisle.nodes [row])
+	if len (plane.passengers) != passenger_count or len (plane.cells) != cell_count:
+		raise ValueError ("run %d doesn't fit the current %s" % (run_number, name))
 
-	class grid_plane_geometry:
-		def __init__ (self, rows, file_count_list, \
-				row_select_function, number_of_bags_function, SS, AS, SA, AA, bin_capacity, \
-				bin_load_delay_function, bin_row_span):
+	for tick in ticks or [last_tick]:
+		stream.write (trajectory_frame (plane, time_step, events, tick) + "\n" + str (int (tick * time_step)) + "\n")
 
-			#
-			# Build the aisles at the appropriate files. The reason I'm subtracting one
-			# is because there are three file widths here, and only two aisles:
-			#
-			#   3   3   4
-			#  SSS|SSS|SSSS
-			#  SSS|SSS|SSSS
-			#
-			#    ...
-			#
+def run_recorded_trial (path, index, planes, adapters, loaders, time_step = 1, common_random_numbers = False, \
+		jet_bridge = None, tracing = True, pictures = False, recorder = None, engine = simulation):
+	#
+	# Runs result index of a record_result_sink file again from its seed, traced as
+	# a single run is, and says whether it took as long as it did in the batch.
+	# Planes, adapters and loaders are found by their (possibly truncated) names.
+	# The time step, common random numbers and jet bridges aren't recorded, so they
+	# have to be given as the batch had them (either scalar engine will do). A vectorised result can't be run
+	# again on its own, since its seed is its whole column's.
+	#
 
-			self.aisles = [aisle (rows + 1, sum (file_count_list [0:i+1]) + i, \
-					bin_capacity, bin_load_delay_function, bin_row_span) \
-					for i in range (len (file_count_list) - 1)]
+	stream = file (path, 'rb')
 
-			self.file_count_list = file_count_list
-			self.start_location = self.aisles [0].head
-			self.passengers = []
-			self.rows = rows + 1
+	if stream.read (record_result_sink.header_size) != record_result_sink.header:
+		raise ValueError ("%s is not a result file in this format" % path)
 
-			#
-			# Create the bridge for the first row. There won't be passengers here, just some nodes
-			# to allow them to cross.
-			#
+	size = calcsize (record_result_sink.record_format)
+	stream.seek (record_result_sink.header_size + index * size)
+	data = stream.read (size)
+	stream.close ()
 
-			for aisle_index in range (1, len (self.aisles)):
-				self.aisles [aisle_index - 1].add_bridge_row ( \
-					self.aisles [aisle_index], 0, directions.east, file_count_list [aisle_index], aisle_index)
+	if len (data) < size:
+		raise ValueError ("%s has no result %d" % (path, index))
 
-			for row in range (1, rows + 1):
-				#
-				# First, connect all of the aisles together east-west.
-				#
+	r = unpack_from (record_result_sink.record_format, data)
+	def find (things, name, width):
+		found = [t for t in things if t.name [:width] == name.rstrip ("\0")]
 
-				self.aisles [0].add_window_row (row, directions.west, file_count_list [0], 0)
+		if len (found) == 0:
+			raise ValueError ("result %d is of %s, which isn't known here" % (index, name.rstrip ("\0")))
 
-				for aisle_index in range (1, len (self.aisles)):
-					self.aisles [aisle_index - 1].add_bridge_row ( \
-						self.aisles [aisle_index], row, directions.east, file_count_list [aisle_index], aisle_index)
+		return found [0]
 
-				self.aisles [len (self.aisles) - 1].add_window_row (row, directions.east, file_count_list [len (file_count_list) - 1], len (self.aisles))
+	plane, adapter, loader = find (planes, r [0], 24), find (adapters, r [1], 16), find (loaders, r [2], 24)
+	possibility, seed, trial, recorded_time = list (r [3:9]), int (r [9]), r [10], r [11]
 
-				#
-				# Next, put a passenger in each seat.
-				# However, we're using the filter-lambda combination to eliminate aisle seats
-				# from that list (those being ones with north or south connections).
-				#
+	events = begin_tracing (tracing, pictures, recorder)
+	boarding_time = run_batch_trial (plane, possibility, adapter, loader, seed, time_step, engine, \
+			common_random_numbers = common_random_numbers, jet_bridge = jet_bridge)
+	end_tracing (events)
 
-				self.passengers += [boarder (boarder.pre_boarding, x, number_of_bags_function (), \
-						self.aisles, SS, AS, SA, AA) \
-						for x in filter (lambda cell: not (cell.connectors [directions.north] or cell.connectors [directions.south]), \
-							self.row (row))]
+	debug (debugging.output, lambda: "Simulation: trial %d of %s_%s on %s took %s units of time (seed %d); it took %s %s." % \
+			(trial, adapter.name, loader.name, plane.name, boarding_time, seed, recorded_time, \
+			 boarding_time == recorded_time and "then too" or "in the batch"))
+	return boarding_time
 
-			#
-			# Now, re-index all of the passengers.
-			#
+class running_statistics:
+	#
+	# The mean and variance of a stream of numbers, kept up to date one number at
+	# a time (Welford's method).
+	#
 
-			for i in range (len (self.passengers)):
-				self.passengers [i].sequence_identifier = i
-
-		def row (self, index):
-			return self.aisles [0].nodes [index].shoot_off (directions.west).trail (directions.east)
-
-		def __str__ (self):
-			s = ""
-			for i in range (self.rows):
-				for cell in self.row (i):
-					s += str (cell)
-				s += "\n"
-			return s
-
-		def compact_representation (self):
-			s = ""
-			for i in range (self.rows):
-				for cell in self.row (i):
-					s += cell.compact_representation ()
-				s += "\n"
-			return s
-
-	class two_floor_plane_geometry:
-		upper_floor = "upper"
-		lower_floor = "lower"
-
-		def __init__ (self, lower_geometry, upper_geometry, floor_change_time_function):
-			self.lower_geometry = lower_geometry
-			self.upper_geometry = upper_geometry
-			self.floor_change_time_function = floor_change_time_function
-			self.passengers = lower_geometry.passengers + upper_geometry.passengers
-			self.start_location = lower_geometry.start_location
-			self.rows = lower_geometry.rows
+	def __init__ (self):
+		self.count = 0
+		self.mean = 0.0
+		self.squared_deviations = 0.0
 
-			#
-			# Change the floors of each geometry.
-			#
+	def add (self, x):
+		self.count += 1
+		delta = x - self.mean
+		self.mean += delta / self.count
+		self.squared_deviations += delta * (x - self.mean)
 
-			for row in range (lower_geometry.rows):
-				for cell in lower_geometry.row (row):
-					cell.floor = two_floor_plane_geometry.lower_floor
+	def variance (self):
+		if self.count < 2:
+			return float ("inf")
 
-			for row in range (upper_geometry.rows):
-				for cell in upper_geometry.row (row):
-					cell.floor = two_floor_plane_geometry.upper_floor
+		return self.squared_deviations / (self.count - 1)
 
-		def board (self, passenger):
-			if passenger.target.floor == two_floor_plane_geometry.upper_floor:
-				self.upper_geometry.start_location.enter (passenger)
-			else:
-				self.lower_geometry.start_location.enter (passenger)
+	def half_width (self):
+		#
+		# Of the approximate 95% confidence interval for the mean.
+		#
 
-		def available (self):
-			return self.upper_geometry.start_location.available () and \
-				   self.lower_geometry.start_location.available ()
+		return 1.96 * (self.variance () / self.count)**0.5
 
-		def compact_representation (self):
-			return "Upper floor:\n" + self.upper_geometry.compact_representation () + \
-				   "\nLower floor:\n" + self.lower_geometry.compact_representation ()
+class p_square_quantile:
+	#
+	# An estimate of the p quantile of a stream of numbers that keeps five markers
+	# instead of the numbers (Jain and Chlamtac's P-squared algorithm). The markers
+	# are the minimum, the p/2, p and (1 + p)/2 quantiles and the maximum; as each
+	# number comes in they are moved towards where those quantiles should be, along
+	# a parabola through their neighbours.
+	#
 
-	class combined_plane_geometry:
-		def __init__ (self, north_geometry, south_geometry, binding_function = \
-				lambda north, south: [north.aisles [x].tail.connect (directions.south, south.aisles [x].head) \
-					for x in range (len (north.aisles))]):
+	def __init__ (self, p):
+		self.p = p
+		self.heights = []
+		self.positions = [1, 2, 3, 4, 5]
+		self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+		self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+	def add (self, x):
+		q = self.heights
+		n = self.positions
+
+		if len (q) < 5:
+			q.append (x)
+			q.sort ()
+			return
+
+		if x < q [0]:
+			q [0] = x
+			k = 0
+		elif x >= q [4]:
+			q [4] = x
+			k = 3
+		else:
+			k = bisect_right (q, x) - 1
 
-			binding_function (north_geometry, south_geometry)
-			self.passengers = [p for p in north_geometry.passengers + south_geometry.passengers]
-			self.rows = north_geometry.rows + south_geometry.rows
-			self.aisles = north_geometry.aisles
+		for i in range (k + 1, 5):
+			n [i] += 1
 
-			self.north_geometry = north_geometry
-			self.south_geometry = south_geometry
+		for i in range (5):
+			self.desired [i] += self.increments [i]
 
-			#
-			# Add the new sequencing index to the south group of passengers.
-			# Also, properly set their aisle knowledge.
-			#
+		for i in (1, 2, 3):
+			d = self.desired [i] - n [i]
 
-			max_in_north = max ([p.sequence_identifier for p in north_geometry.passengers])
-			for p in south_geometry.passengers:
-				p.sequence_identifier += max_in_north
-				p.aisles_on_plane = north_geometry.aisles
+			if (d >= 1 and n [i + 1] - n [i] > 1) or (d <= -1 and n [i - 1] - n [i] < -1):
+				d = d > 0 and 1 or -1
+				estimate = q [i] + d / float (n [i + 1] - n [i - 1]) * \
+						((n [i] - n [i - 1] + d) * (q [i + 1] - q [i]) / float (n [i + 1] - n [i]) + \
+						 (n [i + 1] - n [i] - d) * (q [i] - q [i - 1]) / float (n [i] - n [i - 1]))
 
-			#
-			# Also, update the row indices appropriately.
-			# To do this, we'll just bump them up by the number of rows in the northern part.
-			#
+				if not q [i - 1] < estimate < q [i + 1]:
+					estimate = q [i] + d * (q [i + d] - q [i]) / float (n [i + d] - n [i])
 
-			for row_index in range (south_geometry.rows):
-				for n in south_geometry.row (row_index):
-					n.row += north_geometry.rows
+				q [i] = estimate
+				n [i] += d
+
+	def value (self):
+		#
+		# Until there are five numbers, the quantile of those numbers.
+		#
 
-			binding_function (north_geometry, south_geometry)
+		if len (self.heights) < 5:
+			return self.heights [int (round (self.p * (len (self.heights) - 1)))]
 
-		def row (self, index):
-			if index >= self.north_geometry.rows:
-				return self.north_geometry.row (index)
-			else:
-				return self.south_geometry.row (index)
+		return self.heights [2]
 
-		def __str__ (self):
-			return str (self.north_geometry) + "\n\n" + str (self.south_geometry)
+def settled (column, statistics, precision, until_best_known):
+	#
+	# Whether an adaptive batch can stop running a column: once the confidence
+	# interval for its mean is narrower than precision either side (if precision
+	# isn't None), or, with until_best_known, once it is clear whether it is the
+	# fastest column (its interval lies wholly above the best column's, or, for the
+	# best column, below everyone else's).
+	#
 
-		def compact_representation (self):
-			return self.north_geometry.compact_representation () + "\n\n" + self.south_geometry.compact_representation ()
+	s = statistics [column]
 
-	class single_entrance_manager:
-		def __init__ (self, entrance):
-			self.entrance = entrance
+	if precision != None and s.half_width () <= precision:
+		return True
 
-		def board (self, person):
-			self.entrance.enter (person)
+	if not until_best_known:
+		return False
 
-		def available (self):
-			return self.entrance.current_occupant == None
+	best = min (range (len (statistics)), key = lambda c: statistics [c].mean)
+	others = [statistics [c] for c in range (len (statistics)) if c != best]
 
-	class simulation:
-		def __init__ (self, plane, boarding_function):
-			self.plane = plane
-			self.boarding_function = boarding_function
+	if column == best:
+		return len (others) > 0 and min ([o.mean - o.half_width () for o in others]) > s.mean + s.half_width ()
+	else:
+		return s.mean - s.half_width () > statistics [best].mean + statistics [best].half_width ()
 
-		def run (self, passenger_selector_function = lambda p: True, boarding_delay_function = lambda: 8, time_step = 1):
-			time = 0
-			iterations = 0
-			next_boarding = 0
+def run_batch_job (job):
+	#
+	# Pool workers call this. The batch runner's closures can't be pickled, so it
+	# sets run_batch_job.runner before forking the pool and jobs only carry
+	# indices, possibilities and seeds.
+	#
 
-			debug (debugging.status, lambda: "Beginning simulation...")
-			debug (debugging.not_looped, lambda: str (self.plane) + "\n")
+	return run_batch_job.runner (job)
 
-			currently_unboarded = self.plane.passengers
-			currently_unfinished = []
+def run_statistical_batch_simulation (planes, sensitivity_test_levels, how_many_adapters = 1, trial_count = 200, \
+		workers = 1, root_seed = 0, vectorised = False, sinks = None, manifest = None, boarding_functions = None, \
+		adapters = None, time_step = 1, common_random_numbers = False, precision = None, until_best_known = False, \
+		check_every = 10, recorder = None, jet_bridge = None, engine = simulation):
+	#
+	# Every (plane, possibility, adapter, loader, trial) combination is an independent
+	# job with its own seed derived from root_seed. With workers > 1 (or None for one
+	# per CPU) the jobs are fanned out over a process pool; results come back in job
+	# order, so the output files are the same as for a serial run.
+	#
+	# Each trial is run by engine, which is simulation or event_driven_simulation;
+	# the two give the same results (see event_driven_simulation). The second is
+	# only a modest speedup, about 1.3 to 1.5 times on every plane. Somebody is
+	# nearly always moving, so it still runs more than nine in ten iterations; what
+	# it skips is the passengers counting down a delay, and those cost the time-step
+	# loop little. About half of what is left is the passengers' own steps.
+	#
+	# Boarding times from either engine differ from those of earlier versions
+	# wherever a crossing from the aisle was blocked, since its shuffle delay is now
+	# drawn only once the crossing goes ahead (see boarder.step). On the A380, 11 of
+	# the 20 rows of a 20-trial batch changed; on S2, none did.
+	#
+	# With vectorised set, each (plane, possibility, adapter, loader) column is one job
+	# instead, run by vectorised_batch_simulation. The output has the same layout but
+	# different numbers, since that engine draws its random numbers differently.
+	#
+	# Results go to each of the sinks, which default to the original tab-separated
+	# files (see tsv_result_sink).
+	#
+	# boarding_functions and adapters default to the five loaders and the first
+	# how_many_adapters adapters that were used for the paper.
+	#
+	# manifest names a file in which each finished (plane, possibility, adapter,
+	# loader, trial, seed) unit is recorded. Running the same sweep again with the
+	# same manifest picks up where it left off: finished trials aren't run again, and
+	# the sinks keep what they have already written and append the rest.
+	#
+	# With common_random_numbers, every column of a trial gets the same seed and
+	# the passengers draw from their own streams (see use_common_random_numbers), so
+	# the strategies in a row are compared on the same passengers. The vectorised
+	# engine can't do this.
+	#
 
-			queue = []
+	# With precision or until_best_known set, trial_count is only an upper limit.
+	# Each configuration is run check_every trials at a time, and after each round
+	# the columns that are settled (see settled ()) stop; the configuration is done
+	# when all of them have. Stopped columns are left empty in the rest of the
+	# configuration's rows. The rounds are the same however many workers there are,
+	# so the output is too. This can't be combined with a manifest or the vectorised
+	# engine.
+	#
+	# A trajectory_recorder given as recorder records every trial, in the order they
+	# are run. That has to be in this process, with the scalar engine.
+	#
+	# With jet_bridge settings (see fit_jet_bridges), every trial boards through a
+	# gate and jet bridge. The vectorised engine can't do this either.
+	#
 
-			while len (currently_unfinished) or len (currently_unboarded) > 0 or len (queue) > 0:
-				iterations += 1
+	adaptive = precision != None or until_best_known
 
-				if debugging.tracing and iterations % 1 == 0:
-					debug (debugging.quite_verbose, lambda: self.plane.compact_representation () + "\n" + str (int (time)) + "\n")
+	if vectorised and common_random_numbers:
+		raise ValueError ("common random numbers need a scalar engine, not the vectorised one")
 
-				if len (queue) == 0 and len (currently_unboarded) > 0:
-					#
-					# The boarding function is used so that we can choose to board people in
-					# stages; for example, we may want to board first-class first and then let
-					# everyone else file in randomly.
-					#
+	if vectorised and jet_bridge:
+		raise ValueError ("jet bridges need a scalar engine, not the vectorised one")
 
-					queue += self.boarding_function (time, currently_unboarded)
-					debug (debugging.quite_verbose, lambda: "Enqueued %d person(s)" % len (queue))
-					for passenger in queue:
-						if passenger in currently_unboarded:
-							currently_unboarded.remove (passenger)
-				else:
-					debug (debugging.quite_verbose, lambda: "")
+	if adaptive and (vectorised or manifest):
+		raise ValueError ("adaptive batches can't be resumed or vectorised")
 
-				#
-				# The plane will decide how to board queued passengers.
-				#
+	if recorder and (vectorised or workers != 1):
+		raise ValueError ("trajectories can only be recorded by a serial batch with a scalar engine")
 
-				if len (queue) > 0 and self.plane.available () and time > next_boarding:
-					debug (debugging.quite_verbose, lambda: "Plane: Boarding one person")
-					passenger = queue.pop (0)
+	debugging.current_debug = debugging.error
+	debugging.tracing = False
+	debugging.trace = recorder
 
-					#
-					# Add this passenger to the "unfinished" list and board them onto the plane.
-					# Also, set the clock for that person to be synchronized with the "since-the-beginning-
-					# of-the-boarding-process" clock, and set the appropriate delay before adding the
-					# next person.
-					#
+	if sinks == None:
+		sinks = [tsv_result_sink ()]
 
-					currently_unfinished += [passenger]
-					self.plane.board (passenger)
-					next_boarding = time + boarding_delay_function ()
-				else:
-					debug (debugging.quite_verbose, lambda: "")
+	if boarding_functions == None:
+		boarding_functions = (reverse_block_loader, rotating_block_loader, random_loader, reverse_pyramid_loader, outside_in_loader)
 
-				time += time_step
+	if adapters == None:
+		adapters = [identity_adapter, even_odd_adapter, staggered_adapter][:how_many_adapters]
 
-				delete_necessary = False
-				for p in currently_unfinished:
-					p.personal_delay_counter -= time_step
-					
-					if p.personal_delay_counter < 0:
-						p.personal_delay_counter = 0
+	possibilities = [[1.0, 1.0, 1.0, 1.0, 1.0, d] for d in sensitivity_test_levels.keys ()] + \
+					[[1.0, 1.0, 1.0, 1.0, c, 1.0] for c in sensitivity_test_levels.keys ()] + \
+					[[1.0, 1.0, 1.0, b, 1.0, 1.0] for b in sensitivity_test_levels.keys ()] + \
+					[[1.0, 1.0, a, 1.0, 1.0, 1.0] for a in sensitivity_test_levels.keys ()] + \
+					[[1.0, x, 1.0, 1.0, 1.0, 1.0] for x in sensitivity_test_levels.keys ()] + \
+					[[y, 1.0, 1.0, 1.0, 1.0, 1.0] for y in sensitivity_test_levels.keys ()]
+
+	if len (possibilities) == 0:
+		possibilities = [[1.0] * 6]
+		sensitivity_test_levels = {1.0: 'n'}
+	else:
+		sensitivity_test_levels[1.0] = 'n'
+
+	possibility_description = lambda p: sensitivity_test_levels[p[0]] + sensitivity_test_levels[p[1]] + \
+										sensitivity_test_levels[p[2]] + sensitivity_test_levels[p[3]] + \
+										sensitivity_test_levels[p[4]] + sensitivity_test_levels[p[5]]
+
+	trials_per_configuration = trial_count
+	columns = [(a, b) for a in adapters for b in boarding_functions]
+
+	def seed_for (plane, possibility, a, b, trial):
+		if vectorised:
+			return derive_seed (root_seed, plane.name, possibility_description (possibility), a.name, b.name)
+		elif common_random_numbers:
+			return derive_seed (root_seed, plane.name, possibility_description (possibility), trial)
+		else:
+			return derive_seed (root_seed, plane.name, possibility_description (possibility), a.name, b.name, trial)
 
-					p.step ()
+	def units (plane, possibility, trial):
+		return [(plane.name, tuple (possibility), a.name, b.name, trial, seed_for (plane, possibility, a, b, trial)) \
+				for a, b in columns]
 
-					if p.finished ():
-						delete_necessary = True
-				
-				if delete_necessary:
-					copy = currently_unfinished
-					
-					for p in copy:
-						if p.finished ():
-							currently_unfinished.remove (p)
+	#
+	# With a manifest, a configuration's first trials are skipped if every one of their
+	# units is recorded there. Rows are recorded whole, after the sinks have written
+	# them, so the finished trials of a configuration always come first.
+	#
 
-			return time
+	completed_trials = {}
+	completed_units = set ()
 
-#
-# Planes
-#
+	if manifest:
+		recorded = read_manifest (manifest)
+
+		for plane in planes:
+			for possibility in possibilities:
+				trial = 0
+
+				while trial < trials_per_configuration and recorded.issuperset (units (plane, possibility, trial)):
+					completed_units.update (units (plane, possibility, trial))
+					trial += 1
+
+				completed_trials [(plane.name, tuple (possibility))] = trial
+
+		for sink in sinks:
+			sink.resume (completed_units)
+
+		manifest_file = append_to_manifest (manifest)
+
+	first_trial = lambda plane, possibility: completed_trials.get ((plane.name, tuple (possibility)), 0)
+
+	#
+	# Jobs refer to planes, adapters and loaders by index so that they can be pickled.
+	#
+
+	def jobs ():
+		for plane_index in range (len (planes)):
+			for possibility in possibilities:
+				if vectorised:
+					trials = range (first_trial (planes [plane_index], possibility) < trials_per_configuration and 1 or 0)
+				else:
+					trials = range (first_trial (planes [plane_index], possibility), trials_per_configuration)
+
+				for trial in trials:
+					for adapter_index in range (len (adapters)):
+						for loader_index in range (len (boarding_functions)):
+							yield (plane_index, possibility, adapter_index, loader_index, \
+									seed_for (planes [plane_index], possibility, adapters [adapter_index], \
+										boarding_functions [loader_index], trial))
+
+	if vectorised:
+		run_batch_job.runner = lambda job: run_vectorised_batch (planes [job [0]], job [1], \
+				adapters [job [2]], boarding_functions [job [3]], trials_per_configuration, job [4], time_step)
+	else:
+		run_batch_job.runner = lambda job: run_counted_batch_trial (planes [job [0]], job [1], \
+				adapters [job [2]], boarding_functions [job [3]], job [4], time_step, engine, \
+				common_random_numbers = common_random_numbers, jet_bridge = jet_bridge)
+
+	if workers == 1:
+		pool = None
+		run_jobs = lambda jobs: map (run_batch_job, jobs)
+	else:
+		pool = Pool (workers or cpu_count ())
+		run_jobs = lambda jobs: pool.map (run_batch_job, jobs)
+
+	#
+	# Adaptive batches run each round as it comes; otherwise every job is queued up
+	# front.
+	#
+
+	if not adaptive:
+		if pool:
+			results = pool.imap (run_batch_job, jobs (), 4)
+		else:
+			results = imap (run_batch_job, jobs ())
+
+	def write_row (plane, possibility, trial, row):
+		#
+		# row has a (boarding time, counters) pair for each column, or None for a column
+		# that isn't being run.
+		#
 
-	class airbus_320 (single_entrance_manager, grid_plane_geometry):
-		name = "airbus-320"
+		for column in range (len (columns)):
+			a, b = columns [column]
 
-		def __init__ (self, number_of_bags_function, bin_load_delay_function, SS, AS, SA, AA):
-			grid_plane_geometry.__init__ (self, 23, (3, 3), \
-					lambda row: True, number_of_bags_function, SS, AS, SA, AA, 4, bin_load_delay_function, 2)
+			if row [column] == None:
+				for sink in sinks:
+					sink.skip_result (plane, possibility, a, b, trial)
+				continue
 
-			single_entrance_manager.__init__ (self, self.aisles [0].head)
+			boarding_time, counters = row [column]
 
-	S1 = airbus_320
+			for sink in sinks:
+				sink.add_result (plane, possibility, a, b, trial, seed_for (plane, possibility, a, b, trial), boarding_time, counters)
 
-	class boeing_767_200 (single_entrance_manager, combined_plane_geometry):
-		name = "boeing-767-200"
+			debug (debugging.status, lambda: str (boarding_time) + "\n")
 
-		def __init__ (self, number_of_bags_function, bin_load_delay_function, SS, AS, SA, AA):
-			combined_plane_geometry.__init__ (self, \
-					grid_plane_geometry (8, (2, 2, 2), \
-							lambda row: True, number_of_bags_function, SS, AS, SA, AA, 8, bin_load_delay_function, 3), \
-					grid_plane_geometry (25, (2, 3, 2), \
-							lambda row: True, number_of_bags_function, SS, AS, SA, AA, 8, bin_load_delay_function, 3))
+		for sink in sinks:
+			sink.end_trial ()
 
-			single_entrance_manager.__init__ (self, self.aisles [0].head)
+	for plane in planes:
+		for possibility in possibilities:
+			if first_trial (plane, possibility) == trials_per_configuration:
+				continue
+
+			if len (possibilities) > 1:
+				name = plane.name + possibility_description (possibility)
+			else:
+				name = plane.name
 
-	S2 = boeing_767_200
+			for sink in sinks:
+				sink.begin_configuration (name, plane, possibility, columns, first_trial (plane, possibility))
 
-	class boeing_767_400 (single_entrance_manager, combined_plane_geometry):
-		name = "boeing-767-400"
+			for a, b in columns:
+				debug (debugging.status, lambda: "%s_%s\n" % (a.name, b.name))
 
-		def __init__ (self, number_of_bags_function, bin_load_delay_function, SS, AS, SA, AA):
-			combined_plane_geometry.__init__ (self, \
-					grid_plane_geometry (8, (2, 2, 2), \
-							lambda row: True, number_of_bags_function, SS, AS, SA, AA, 8, bin_load_delay_function, 3), \
-					grid_plane_geometry (25, (2, 3, 2), \
-							lambda row: True, number_of_bags_function, SS, AS, SA, AA, 8, bin_load_delay_function, 3))
+			if adaptive:
+				statistics = [running_statistics () for column in columns]
+				active = range (len (columns))
+				trial = 0
 
-			single_entrance_manager.__init__ (self, self.aisles [0].head)
+				while trial < trials_per_configuration and len (active):
+					rows = range (trial, min (trial + check_every, trials_per_configuration))
+					round_results = run_jobs ([(planes.index (plane), possibility) + \
+							divmod (column, len (boarding_functions)) + \
+							(seed_for (plane, possibility, columns [column][0], columns [column][1], t),) \
+						for t in rows for column in active])
 
-	M1 = boeing_767_400
+					for i in range (len (rows)):
+						row = [None] * len (columns)
 
-	class airbus_a300_600 (single_entrance_manager, grid_plane_geometry):
-		name = "airbus-a300-600"
+						for k in range (len (active)):
+							row [active [k]] = round_results [i * len (active) + k]
+							statistics [active [k]].add (row [active [k]][0])
 
-		def __init__ (self, number_of_bags_function, bin_load_delay_function, SS, AS, SA, AA):
-			grid_plane_geometry.__init__ (self, 50, (2, 4, 2), \
-					lambda row: True, number_of_bags_function, SS, AS, SA, AA, 4, bin_load_delay_function, 2)
+						write_row (plane, possibility, rows [i], row)
 
-			single_entrance_manager.__init__ (self, self.aisles [0].head)
+					active = [column for column in active if not settled (column, statistics, precision, until_best_known)]
+					trial += check_every
 
-	M2 = airbus_a300_600
+				for sink in sinks:
+					sink.end_configuration ()
 
-	class boeing_747 (single_entrance_manager, grid_plane_geometry):
-		name = "boeing-747"
+				continue
 
-		def __init__ (self, number_of_bags_function, bin_load_delay_function, SS, AS, SA, AA):
-			grid_plane_geometry.__init__ (self, 40, (3, 4, 3), \
-					lambda row: True, number_of_bags_function, SS, AS, SA, AA, 4, bin_load_delay_function, 2)
+			if vectorised:
+				column_results = [results.next () for column in columns]
+				next_result = lambda column, trial: (column_results [column][trial], None)
+			else:
+				next_result = lambda column, trial: results.next ()
+			
+			for trial in range (first_trial (plane, possibility), trials_per_configuration):
+				write_row (plane, possibility, trial, [next_result (column, trial) for column in range (len (columns))])
 
-			single_entrance_manager.__init__ (self, self.aisles [0].head)
+				if manifest:
+					manifest_file.write ("".join (["%s\t%s\t%s\t%s\t%d\t%d\n" % (plane_name, \
+							",".join ([repr (x) for x in factors]), adapter_name, loader_name, unit_trial, seed) \
+						for plane_name, factors, adapter_name, loader_name, unit_trial, seed in units (plane, possibility, trial)]))
+					manifest_file.flush ()
 
-	L1 = boeing_747
+				debug (debugging.status, lambda: "\n")
 
-	class airbus_380 (single_entrance_manager, two_floor_plane_geometry):
-		name = "airbus-380"
+			for sink in sinks:
+				sink.end_configuration ()
 
-		def __init__ (self, number_of_bags_function, bin_load_delay_function, SS, AS, SA, AA):
-			two_floor_plane_geometry.__init__ (self, \
-					grid_plane_geometry (40, (3, 4, 3), \
-						lambda row: True, number_of_bags_function, SS, AS, SA, AA, 4, bin_load_delay_function, 2), \
-					grid_plane_geometry (30, (2, 4, 2), \
-						lambda row: True, number_of_bags_function, SS, AS, SA, AA, 4, bin_load_delay_function, 2), \
-					SS)
+	for sink in sinks:
+		sink.close ()
 
-		def board (self, passenger):
-			two_floor_plane_geometry.board (self, passenger)
+	if manifest:
+		manifest_file.close ()
 
-		def available (self):
-			return two_floor_plane_geometry.available (self)
+	if pool:
+		pool.close ()
+		pool.join ()
 
-	L2 = airbus_380
+	debugging.trace = None
 
 #
-# Test code
+# Command line
 #
 
+class phase_timer:
 	#
-	# Passenger queues
+	# Used by --profile. Selected functions are wrapped so that the time spent in
+	# them is added to their phase. Time spent in a phase nested inside another (a
+	# loader called by an engine, say) only counts towards the inner one, so the
+	# totals add up to the time of the run. A phase can also be a function of the
+	# wrapped function's arguments; passenger steps are split up by the passenger's
+	# seek phase that way.
 	#
 
-	def blocks (unboarded_passengers, number_of_blocks):
-		#
-		# This isn't a queue function; rather, it just breaks the plane
-		# into roughly equal blocks (actually, the blocks are adaptively
-		# sized to be roughly equal for the number of passengers remaining).
-		#
+	step_phases = ("finding aisles", "finding rows", "finding seats")
+
+	def __init__ (self):
+		self.totals = {}
+		self.stack = []
+		self.last = wall_clock ()
+
+	def switch (self):
+		now = wall_clock ()
+
+		if len (self.stack):
+			self.totals [self.stack [-1]] = self.totals.get (self.stack [-1], 0) + now - self.last
+
+		self.last = now
+
+	def wrap (self, function, phase):
+		def timed (*arguments, **keywords):
+			self.switch ()
+			self.stack.append (callable (phase) and phase (*arguments) or phase)
+
+			try:
+				return function (*arguments, **keywords)
+			finally:
+				self.switch ()
+				self.stack.pop ()
+
+		timed.__name__ = function.__name__
 
-		farthest_back_row = max ([p.target.row for p in unboarded_passengers])
+		if hasattr (function, "name"):
+			timed.name = function.name
 
+		return timed
+
+	def install (self):
 		#
-		# Choose even sections.
+		# Wraps the entry points of each phase where they are looked up (module globals
+		# and class attributes), so this has to happen before the run is set up.
 		#
 
-		zone = range (number_of_blocks)
-		for i in range (len (zone)):
-			zone [i] = filter (lambda p: p.target.row * number_of_blocks / (farthest_back_row + 1) == i, unboarded_passengers)
-
-		return zone
+		module = globals ()
 
-	def random_loader (time, unboarded_passengers):
-		return shuffle (unboarded_passengers)
-	random_loader.name = "pre_assigned_random"
+		for name in ("plane_generator", "plane_from_template"):
+			module [name] = self.wrap (module [name], "plane setup")
 
-	def sequential_loader (time, unboarded_passengers):
-		return unboarded_passengers
-	sequential_loader.name = "sequential"
+		for loader in all_loaders:
+			module [loader.__name__] = self.wrap (loader, "loaders")
 
-	def sequential_block_loader (time, unboarded_passengers):
-		b = blocks (shuffle (unboarded_passengers), 5)
-		return b[0] + b[1] + b[2] + b[3] + b[4]
-	sequential_block_loader.name = "sequential_block"
+		boarder.step = self.wrap (boarder.__dict__ ["step"], lambda passenger: phase_timer.step_phases [passenger.seek_phase])
+		vectorised_batch_simulation.step = self.wrap (vectorised_batch_simulation.__dict__ ["step"], "passenger steps")
 
-	def reverse_block_loader (time, unboarded_passengers):
-		b = blocks (shuffle (unboarded_passengers), 5)
-		return b[4] + b[3] + b[2] + b[1] + b[0]
-	reverse_block_loader.name = "reverse_block"
+		for engine in (simulation, event_driven_simulation, vectorised_batch_simulation):
+			engine.run = self.wrap (engine.__dict__ ["run"], "engine bookkeeping")
 
-	def reverse_loader (time, unboarded_passengers):
-		unboarded_passengers.reverse ()
-		return unboarded_passengers
-	reverse_loader.name = "reverse_sequential"
+		for sink in (tsv_result_sink, record_result_sink, summary_result_sink, counter_result_sink):
+			for name in ("begin_configuration", "add_result", "skip_result", "end_trial", "end_configuration", "close"):
+				setattr (sink, name, self.wrap (sink.__dict__ [name], "writing results"))
 
-	def outside_in_loader (time, unboarded_passengers):
-		maximum_distance_to_aisle = max ([p.target.nearest_aisle ()[0] for p in unboarded_passengers])
-		return filter (lambda p: p.target.nearest_aisle ()[0] == maximum_distance_to_aisle, shuffle (unboarded_passengers))
-	outside_in_loader.name = "outside_in"
+	def report (self, elapsed):
+		self.switch ()
+		phases = ("plane setup", "loaders") + phase_timer.step_phases + ("passenger steps", "engine bookkeeping", "writing results")
 
-	def reverse_pyramid_loader (time, unboarded_passengers):
-		maximum_distance_to_aisle = max ([p.target.nearest_aisle ()[0] for p in unboarded_passengers])
-		farthest_back_row = max ([p.target.row for p in unboarded_passengers])
+		for phase in phases:
+			stderr.write ("%-20s %9.2fs %6.1f%%\n" % (phase, self.totals.get (phase, 0), 100 * self.totals.get (phase, 0) / elapsed))
 
-		return filter (lambda p: \
-				(maximum_distance_to_aisle - p.target.nearest_aisle ()[0]) * (farthest_back_row / 2) < \
-				p.target.row, shuffle (unboarded_passengers))
-	reverse_pyramid_loader.name = "reverse_pyramid"
+		other = elapsed - sum ([self.totals.get (phase, 0) for phase in phases])
+		stderr.write ("%-20s %9.2fs %6.1f%%\n" % ("other", other, 100 * other / elapsed))
+		stderr.write ("%-20s %9.2fs\n" % ("total", elapsed))
 
-	def rotating_block_loader (time, unboarded_passengers):
-		b = blocks (shuffle (unboarded_passengers), 5)
-		return b[0] + b[4] + b[1] + b[3] + b[2]
-	rotating_block_loader.name = "rotating_block"
+all_loaders = (random_loader, sequential_loader, sequential_block_loader, reverse_block_loader, reverse_loader, \
+		outside_in_loader, reverse_pyramid_loader, rotating_block_loader)
 
+def main (arguments):
 	#
-	# Variations on the queue functions
+	# Runs used to be chosen by editing the last few lines of this file; now they
+	# are chosen on the command line. Planes, loaders and adapters are given as
+	# comma-separated names (S1 or airbus-320, reverse_block or reverse_block_loader,
+	# original or identity_adapter).
 	#
 
-	def staggered_adapter (previous_method):
-		return lambda time, unboarded_passengers: \
-				filter (lambda p: p.target.row % 2 == p.target.major_file % 2, previous_method (time, unboarded_passengers)) + \
-				filter (lambda p: p.target.row % 2 != p.target.major_file % 2, previous_method (time, unboarded_passengers))
-	staggered_adapter.name = "staggered"
-
-	def even_odd_adapter (previous_method):
-		return lambda time, unboarded_passengers: \
-				filter (lambda p: p.target.row % 2 == 0, previous_method (time, unboarded_passengers)) + \
-				filter (lambda p: p.target.row % 2 == 1, previous_method (time, unboarded_passengers))
-	even_odd_adapter.name = "even_odd"
-
-	def identity_adapter (previous_method):
-		return lambda time, unboarded_passengers: previous_method (time, unboarded_passengers)
-	identity_adapter.name = "original"
+	parser = ArgumentParser (description = "Simulates the boarding of an aircraft.")
+	parser.add_argument ("mode", nargs = "?", default = "single", \
+			choices = ("single", "batch", "compare-engines", "compare-vectorised", "benchmark", "replay", "rerun"), \
+			help = "a single traced run, a statistical batch, one of the engine checks, a benchmark, " + \
+				"a replay of recorded trajectories, or a traced rerun of a recorded batch result (default: single)")
+	parser.add_argument ("--planes", help = "planes to simulate (default: S2 for a single run, otherwise all six)")
+	parser.add_argument ("--layouts", help = "a JSON file of plane layouts (see compile_layout) to add to the planes")
+	parser.add_argument ("--layout-cache", help = "keep compiled layouts in this directory")
+	parser.add_argument ("--loaders", help = "boarding functions to use")
+	parser.add_argument ("--adapters", help = "adapters to wrap the boarding functions in")
+	parser.add_argument ("--sensitivity", default = "", \
+			help = "sensitivity levels as factor:letter pairs, for example 0.5:l,1.75:h")
+	parser.add_argument ("--trials", type = int, help = "trials per configuration (default: 5 for a benchmark, otherwise 200)")
+	parser.add_argument ("--seed", type = int, help = "root seed (default: 0, or random and reported for a single run)")
+	parser.add_argument ("--workers", type = int, default = 1, help = "batch worker processes, 0 for one per CPU (default: 1)")
+	parser.add_argument ("--time-step", type = float, help = "simulation time step (default: 0.5 for a single run, otherwise 1)")
+	parser.add_argument ("--output-dir", default = "", help = "where batch output files go (default: here)")
+	parser.add_argument ("--records", \
+			help = "also write binary result records to this file (see record_result_sink), or rerun one from it")
+	parser.add_argument ("--record", type = int, help = "the recorded result to rerun, counting from 0")
+	parser.add_argument ("--manifest", help = "record finished batch units here, and resume from it")
+	parser.add_argument ("--summary", help = "also write a summary of each batch column to this file")
+	parser.add_argument ("--counters", help = "also write what the passengers spent their time on in each trial to this file")
+	parser.add_argument ("--vectorised", action = "store_true", help = "run batches with the NumPy engine")
+	parser.add_argument ("--common-random-numbers", action = "store_true", \
+			help = "give every strategy in a batch trial the same passengers")
+	parser.add_argument ("--precision", type = float, \
+			help = "stop running a batch column once its mean is known to within this (--trials becomes a limit)")
+	parser.add_argument ("--until-best-known", action = "store_true", \
+			help = "stop running a batch column once it is clear whether it is the fastest (--trials becomes a limit)")
+	parser.add_argument ("--check-every", type = int, default = 10, \
+			help = "trials between the checks made with --precision or --until-best-known (default: 10)")
+	parser.add_argument ("--jet-bridge", type = float, \
+			help = "board through a gate and a jet bridge of this length in front of each door (see jet_bridge)")
+	parser.add_argument ("--bridge-capacity", type = int, default = 12, \
+			help = "how many passengers fit on a jet bridge at once (default: 12)")
+	parser.add_argument ("--walking-speed", type = float, default = 1.0, \
+			help = "the mean walking speed on a jet bridge; its deviation is a fifth of it (default: 1.0)")
+	parser.add_argument ("--scan-time", type = float, \
+			help = "the mean time the gate agent takes per passenger; its deviation is a seventh of it " + \
+				"(default: the boarding delay)")
+	parser.add_argument ("--overtaking", action = "store_true", help = "let passengers overtake each other on a jet bridge")
+	parser.add_argument ("--quiet", action = "store_true", help = "don't trace a single run")
+	parser.add_argument ("--pictures", action = "store_true", help = "draw the plane at every step of a traced single run")
+	parser.add_argument ("--trajectories", \
+			help = "record the passengers' trajectories in this file (see trajectory_recorder), or replay them from it")
+	parser.add_argument ("--run", type = int, help = "the recorded run to replay (default: list the runs)")
+	parser.add_argument ("--tick", type = int, action = "append", \
+			help = "a tick of the run to draw; may be given more than once (default: the last)")
+	parser.add_argument ("--profile", action = "store_true", help = "report the time spent in each phase of the run")
+	parser.add_argument ("--engine", default = "timestep", choices = sorted (benchmark_engines.keys ()), \
+			help = "the engine for a single run, a rerun, a batch or a benchmark; vectorised is the same as " + \
+				"--vectorised, and only runs batches and benchmarks (default: timestep)")
+	parser.add_argument ("--output", help = "write the benchmark report here instead of to standard output")
+	parser.add_argument ("--baseline", help = "compare the benchmark with this earlier report")
+	parser.add_argument ("--tolerance", type = float, default = 0.1, \
+			help = "the slowdown, as a fraction, counted as a regression (default: 0.1)")
+	options = parser.parse_args (arguments)
+
+	if options.profile:
+		timer = phase_timer ()
+		timer.install ()
 
 	#
-	# Running routines
+	# The tables are built after the timer is installed, so that they hold the
+	# wrapped loaders.
 	#
 
-	def plane_generator (plane, r, SS, AS, SA, AA, bin_load_delay):
-		return plane (	number_of_bags_function			= lambda: r.randint (0, 2), \
-						bin_load_delay_function			= lambda t, c: t**0.5 * r.gauss (bin_load_delay, bin_load_delay / 6.0), \
-						SS								= SS,
-						AS								= AS,
-						SA								= SA,
-						AA								= AA)
+	plane_table = {}
+	for short_name, plane in (("S1", S1), ("S2", S2), ("M1", M1), ("M2", M2), ("L1", L1), ("L2", L2)):
+		plane_table [short_name] = plane_table [plane.name] = plane
 
-	def run_single_simulation ():
-		r = Random ()
+	compiled_layout.cache_directory = options.layout_cache
 
-		debugging.current_debug = debugging.very_verbose
-		debugging.tracing = True
+	if options.layouts:
+		try:
+			for layout in read_layouts (options.layouts):
+				plane_table [layout.name] = layout
+		except (IOError, ValueError, KeyError, TypeError), e:
+			parser.error ("can't read the layouts in %s: %s" % (options.layouts, e))
+
+	loader_table = {}
+	for loader in [globals () [l.__name__] for l in all_loaders]:
+		loader_table [loader.name] = loader_table [loader.__name__] = loader
+
+	adapter_table = {}
+	for adapter in (identity_adapter, even_odd_adapter, staggered_adapter):
+		adapter_table [adapter.name] = adapter_table [adapter.__name__] = adapter
+
+	def lookup (kind, table, names, default):
+		if names == None:
+			names = default
+
+		try:
+			return [table [name] for name in names.split (",") if name]
+		except KeyError, e:
+			parser.error ("unknown %s %s (choose from %s)" % (kind, e, ", ".join (sorted (table.keys ()))))
+
+	if options.mode == "single":
+		plane_default, loader_default, adapter_default = "S2", "reverse_block", "staggered"
+	elif options.mode == "compare-engines":
+		plane_default, loader_default, adapter_default = "S1,S2,M1,M2,L1,L2", "sequential,reverse_sequential", "original"
+	elif options.mode == "compare-vectorised":
+		plane_default, loader_default, adapter_default = "S1,S2,M1,M2,L1,L2", "pre_assigned_random,reverse_block", "original"
+	elif options.mode == "benchmark":
+		plane_default, loader_default, adapter_default = "S1,S2,M1,M2,L1,L2", \
+				",".join ([loader.name for loader in all_loaders]), "original"
+	else:
+		plane_default, loader_default, adapter_default = "S1,S2,M1,M2,L1,L2", \
+				"reverse_block,rotating_block,pre_assigned_random,reverse_pyramid,outside_in", "original"
+
+	planes = lookup ("plane", plane_table, options.planes, plane_default)
+	loaders = lookup ("loader", loader_table, options.loaders, loader_default)
+	adapters = lookup ("adapter", adapter_table, options.adapters, adapter_default)
+
+	sensitivity_test_levels = {}
+	for level in options.sensitivity.split (","):
+		if level:
+			factor, letter = level.split (":")
+			sensitivity_test_levels [float (factor)] = letter
+
+	if options.engine == "vectorised" and options.mode in ("single", "rerun"):
+		parser.error ("the vectorised engine only runs batches and benchmarks")
+
+	if options.vectorised and options.engine not in ("timestep", "vectorised"):
+		parser.error ("--vectorised can't be used with --engine %s" % options.engine)
+
+	if options.engine == "vectorised" and options.mode == "batch":
+		options.vectorised = True
+
+	engine = benchmark_engines [options.engine]
+
+	if options.vectorised and options.common_random_numbers:
+		parser.error ("--common-random-numbers can't be used with --vectorised")
+
+	if options.jet_bridge != None and (options.vectorised or options.mode not in ("single", "batch", "rerun")):
+		parser.error ("--jet-bridge can only be used by a single run, a rerun or a batch without --vectorised")
+
+	if options.jet_bridge != None and (options.jet_bridge <= 0 or options.bridge_capacity < 1):
+		parser.error ("a jet bridge needs a length and room for at least one passenger")
+
+	jet_bridge = None
+
+	if options.jet_bridge != None:
+		jet_bridge = dict (	length				= options.jet_bridge, \
+							capacity			= options.bridge_capacity, \
+							walking_speed		= (options.walking_speed, options.walking_speed / 5.0), \
+							scan				= options.scan_time and (options.scan_time, options.scan_time / 7.0), \
+							overtaking			= options.overtaking)
+
+	if (options.precision != None or options.until_best_known) and (options.vectorised or options.manifest):
+		parser.error ("--precision and --until-best-known can't be used with --vectorised or --manifest")
+
+	if options.trajectories and options.mode == "batch" and (options.workers != 1 or options.vectorised):
+		parser.error ("--trajectories can only be recorded by a batch with --workers 1 and without --vectorised")
+
+	if options.mode == "replay" and not options.trajectories:
+		parser.error ("replay needs --trajectories")
+
+	if options.mode == "rerun" and (not options.records or options.record == None):
+		parser.error ("rerun needs --records and --record")
+
+	if options.trials == None:
+		options.trials = options.mode == "benchmark" and 5 or 200
+
+	recorder = None
+
+	if options.trajectories and options.mode in ("single", "batch", "rerun"):
+		recorder = trajectory_recorder (options.trajectories)
+
+	if options.mode == "single":
+		run = lambda: run_single_simulation (planes [0], loaders [0], adapters [0], options.time_step or 0.5, \
+				options.seed, not options.quiet, options.pictures, recorder, jet_bridge, engine)
+	elif options.mode == "replay":
+		run = lambda: replay_trajectories (options.trajectories, options.run, options.tick, \
+				planes = set (plane_table.values ()))
+	elif options.mode == "rerun":
+		run = lambda: run_recorded_trial (join (options.output_dir, options.records), options.record, \
+				set (plane_table.values ()), set (adapter_table.values ()), set (loader_table.values ()), \
+				options.time_step or 1, options.common_random_numbers, jet_bridge, not options.quiet, options.pictures, recorder, \
+				engine)
+	elif options.mode == "compare-engines":
+		run = lambda: run_engine_comparison (planes, loaders, options.seed or 0, options.time_step or 1)
+	elif options.mode == "compare-vectorised":
+		run = lambda: run_vectorised_comparison (planes, loaders, options.trials, options.seed or 0, options.time_step or 1)
+	elif options.mode == "benchmark":
+		run = lambda: run_benchmark (planes, loaders, options.engine, options.trials, options.seed or 0, options.time_step or 1, \
+				options.output, options.baseline, options.tolerance)
+	else:
+		sinks = [tsv_result_sink (options.output_dir)]
+
+		if options.records:
+			sinks += [record_result_sink (join (options.output_dir, options.records))]
+
+		if options.summary:
+			sinks += [summary_result_sink (join (options.output_dir, options.summary))]
+
+		if options.counters:
+			sinks += [counter_result_sink (join (options.output_dir, options.counters))]
+
+		run = lambda: run_statistical_batch_simulation (planes, sensitivity_test_levels, len (adapters), options.trials, \
+				workers = options.workers or None, root_seed = options.seed or 0, vectorised = options.vectorised, \
+				sinks = sinks, manifest = options.manifest and join (options.output_dir, options.manifest), \
+				boarding_functions = loaders, adapters = adapters, time_step = options.time_step or 1, \
+				common_random_numbers = options.common_random_numbers, precision = options.precision, \
+				until_best_known = options.until_best_known, check_every = options.check_every, recorder = recorder, \
+				jet_bridge = jet_bridge, engine = engine)
 
-		debug (debugging.status, lambda: "Building aircraft model and passenger list...")
-		debug (debugging.output, lambda: "Simulation: boarding took %s units of time." % \
-				simulation (plane_generator (S2, r, \
-						lambda: r.gauss (7.0, 2.0), \
-						lambda: r.gauss (3.0, 0.8), \
-						lambda: r.gauss (3.5, 0.4), \
-						lambda: r.gauss (2.0, 0.3), \
-						3.0), \
-					boarding_function = staggered_adapter (reverse_block_loader)).run ( \
-						passenger_selector_function		= lambda passenger: True, \
-						boarding_delay_function			= lambda: r.gauss (7.0, 1.0), \
-						time_step						= 0.5))
+	started = wall_clock ()
+	result = run ()
 
-	def run_statistical_batch_simulation (planes, sensitivity_test_levels, how_many_adapters = 1, trial_count = 200):
-		r = Random ()
+	if recorder:
+		recorder.close ()
 
-		debugging.current_debug = debugging.error
-		debugging.tracing = False
+	if options.profile:
+		if options.mode == "batch" and options.workers != 1:
+			stderr.write ("(batch workers run in their own processes, so only --workers 1 is profiled)\n")
+		elif options.mode == "benchmark":
+			stderr.write ("(each benchmark pair runs in its own process, so none of it is profiled)\n")
 
-		boarding_functions = (reverse_block_loader, rotating_block_loader, random_loader, reverse_pyramid_loader, outside_in_loader)
-		adapters = [identity_adapter, even_odd_adapter, staggered_adapter][:how_many_adapters]
-		
-		adjustable_parameters = (7.0, 3.0, 3.5, 2.0, 2.0, 0.8, 0.4, 0.3, 2.0, 7.0)
-
-		possibilities = [[1.0, 1.0, 1.0, 1.0, 1.0, d] for d in sensitivity_test_levels.keys ()] + \
-						[[1.0, 1.0, 1.0, 1.0, c, 1.0] for c in sensitivity_test_levels.keys ()] + \
-						[[1.0, 1.0, 1.0, b, 1.0, 1.0] for b in sensitivity_test_levels.keys ()] + \
-						[[1.0, 1.0, a, 1.0, 1.0, 1.0] for a in sensitivity_test_levels.keys ()] + \
-						[[1.0, x, 1.0, 1.0, 1.0, 1.0] for x in sensitivity_test_levels.keys ()] + \
-						[[y, 1.0, 1.0, 1.0, 1.0, 1.0] for y in sensitivity_test_levels.keys ()]
-
-		if len (possibilities) == 0:
-			possibilities = [[1.0] * 6]
-			sensitivity_test_levels = {1.0: 'n'}
-		else:
-			sensitivity_test_levels[1.0] = 'n'
+		timer.report (wall_clock () - started)
 
-		possibility_description = lambda p: sensitivity_test_levels[p[0]] + sensitivity_test_levels[p[1]] + \
-											sensitivity_test_levels[p[2]] + sensitivity_test_levels[p[3]] + \
-											sensitivity_test_levels[p[4]] + sensitivity_test_levels[p[5]]
+	#
+	# A benchmark that found regressions exits with a failure status.
+	#
 
-		trials_per_configuration = trial_count
-		time_step = 1
+	if options.mode == "benchmark" and result:
+		return 1
 
-		for plane in planes:
-			for possibility in possibilities:
-				if len (possibilities) > 1:
-					current_file = file (plane.name + possibility_description (possibility), 'w')
-				else:
-					current_file = file (plane.name, 'w')
-				
-				for a in adapters:
-					for b in boarding_functions:
-						current_file.write ("%s_%s\t" % (a.name, b.name))
-						debug (debugging.status, lambda: "%s_%s\n" % (a.name, b.name))
-						
-				current_file.write ("\n")
-				
-				for trial in range (trials_per_configuration):
-					for a in adapters:
-						for b in boarding_functions:
-							immediate_result = str (simulation ( \
-									plane = plane_generator (plane, r, \
-										lambda: r.gauss (adjustable_parameters [0] * possibility [0], adjustable_parameters [4] * possibility [0]), \
-										lambda: r.gauss (adjustable_parameters [1] * possibility [1], adjustable_parameters [5] * possibility [1]), \
-										lambda: r.gauss (adjustable_parameters [2] * possibility [2], adjustable_parameters [6] * possibility [2]), \
-										lambda: r.gauss (adjustable_parameters [3] * possibility [3], adjustable_parameters [7] * possibility [3]), \
-										adjustable_parameters [8] * possibility [4]), \
-									boarding_function = a (b)).run ( \
-										passenger_selector_function		= lambda passenger: True, \
-										boarding_delay_function			= lambda: \
-											r.gauss (adjustable_parameters [9] * possibility [5], possibility [5]), \
-										time_step						= time_step))
-
-							current_file.write (immediate_result + "\t")
-							debug (debugging.status, lambda: immediate_result + "\n")
-
-					current_file.write ("\n")
-					current_file.flush ()
-					debug (debugging.status, lambda: "\n")
-
-				current_file.close ()
-
-	run_single_simulation ()
-#	run_statistical_batch_simulation ([L2], {}, 3, 200)
-#	run_statistical_batch_simulation ([S1, S2, M1, M2, L1, L2], {0.5: 'l', 1.75: 'h'}, 1, 25)
-
-main ()
+	return 0
+
+if __name__ == "__main__":
+	raise SystemExit (main (argv [1:]))
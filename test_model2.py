@@ -0,0 +1,70 @@
+#
+# Checks that the vectorised engine hasn't drifted from the time-step engine, and
+# that layouts board through the doors they describe:
+#
+#   python -m unittest test_model2
+#
+# The engines draw their random numbers differently, so the vectorised check is
+# statistical (see compare_vectorised); the seeds are fixed, so it passes or fails
+# the same way every time. It is skipped when NumPy isn't there.
+#
+
+from os.path import dirname
+from os.path import join
+from unittest import TestCase
+from unittest import skipIf
+
+import model2
+
+class vectorised_engine_test (TestCase):
+	trial_count = 40
+
+	def setUp (self):
+		model2.debugging.current_debug = model2.debugging.error
+		model2.debugging.tracing = False
+
+	def check (self, plane, boarding_function):
+		scalar, vectorised, t, d, scalar_duration, vectorised_duration, consistent = \
+				model2.compare_vectorised (plane, boarding_function, vectorised_engine_test.trial_count)
+
+		self.assertTrue (consistent, "%s_%s: t = %.2f, D = %.3f" % (plane.name, boarding_function.name, t, d))
+
+	@skipIf (model2.numpy == None, "the vectorised engine needs NumPy")
+	def test_random_loader (self):
+		self.check (model2.S1, model2.random_loader)
+
+	@skipIf (model2.numpy == None, "the vectorised engine needs NumPy")
+	def test_block_loader (self):
+		self.check (model2.S1, model2.reverse_block_loader)
+
+	@skipIf (model2.numpy == None, "the vectorised engine needs NumPy")
+	def test_several_doors (self):
+		layouts = dict ([(layout.name, layout) for layout in model2.read_layouts (join (dirname (__file__), "layouts.json"))])
+		self.check (layouts ['airbus-320-front-and-rear'], model2.outside_in_loader)
+
+class layout_test (TestCase):
+	#
+	# The back section of a 767 has its second aisle one file east of the front's.
+	#
+
+	sections = [{"rows": 8, "seat_groups": [2, 2, 2]}, {"rows": 25, "seat_groups": [2, 3, 2]}]
+
+	def setUp (self):
+		model2.debugging.current_debug = model2.debugging.error
+		model2.debugging.tracing = False
+
+	def check (self, doors):
+		layout = model2.compile_layout ({"name": "rear-doors", "decks": [{"sections": layout_test.sections, "doors": doors}]})
+		plane = layout (lambda: 1, lambda load, capacity: 1, None, None, None, None)
+		used = set ([plane.doors.index (plane.door_policy (p, plane.doors)) for p in plane.passengers])
+
+		self.assertEqual (used, set (range (len (doors))))
+		self.assertEqual (model2.run_batch_trial (layout, [1.0] * 6, model2.identity_adapter, model2.random_loader, 1, 1), \
+				model2.run_batch_trial (layout, [1.0] * 6, model2.identity_adapter, model2.random_loader, 1, 1, \
+					model2.event_driven_simulation))
+
+	def test_rear_door (self):
+		self.check ([{"aisle": 0}, {"aisle": 1, "end": "rear"}])
+
+	def test_rear_doors_only (self):
+		self.check ([{"aisle": 0, "end": "rear"}, {"aisle": 1, "end": "rear"}])